@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "authentication"
+
+    def ready(self):
+        from django.contrib.auth.models import User
+
+        from baraholka.models import UserProfile
+
+        from .signals import invalidate_cached_profile_user, invalidate_cached_user
+
+        post_save.connect(invalidate_cached_user, sender=User)
+        post_delete.connect(invalidate_cached_user, sender=User)
+        post_save.connect(invalidate_cached_profile_user, sender=UserProfile)
+        post_delete.connect(invalidate_cached_profile_user, sender=UserProfile)
@@ -0,0 +1,139 @@
+import pickle
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .revocation import revocation_store
+
+
+# Сверх этого числа записей устаревшие удаляются, а если их нет - кэш
+# очищается целиком
+USER_CACHE_MAX_ENTRIES = 10000
+
+
+def user_version_key(user_id):
+    return f"auth_user_version:{user_id}"
+
+
+class UserCache:
+    """
+    Кэш пользователей процесса с коротким временем жизни.
+
+    Запись действительна, пока совпадает версия пользователя в кэше
+    default: изменение пользователя или профиля меняет версию. В этом
+    процессе изменение видно сразу, в остальных - только если кэш общий
+    (например, Redis); с LocMemCache по умолчанию они используют свои
+    копии до истечения AUTH_USER_CACHE_TIMEOUT. Пользователь хранится
+    сериализованным, поэтому каждый запрос получает свой экземпляр.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def timeout(self):
+        return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+
+    def get_version(self, user_id):
+        key = user_version_key(user_id)
+        version = cache.get(key)
+        if version is None:
+            # Версия могла быть вытеснена из кэша: вместо значения по
+            # умолчанию заводится новая, иначе записи, сохраненные до
+            # изменения пользователя, снова стали бы действительными
+            version = uuid.uuid4().hex
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        return version
+
+    def get(self, user_id, version):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        entry_version, expires_at, data = entry
+        if entry_version != version or expires_at < time.monotonic():
+            return None
+        return pickle.loads(data)
+
+    def set(self, user_id, version, user):
+        if not self.timeout:
+            return
+        data = pickle.dumps(user)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= USER_CACHE_MAX_ENTRIES:
+                self._entries = {
+                    key: entry for key, entry in self._entries.items() if entry[1] > now
+                }
+                if len(self._entries) >= USER_CACHE_MAX_ENTRIES:
+                    self._entries = {}
+            self._entries[user_id] = (version, now + self.timeout, data)
+
+    def invalidate(self, user_id):
+        # Новая версия и сразу, и после фиксации: иначе параллельный запрос
+        # может закэшировать пользователя до коммита
+        def bump():
+            cache.set(user_version_key(user_id), uuid.uuid4().hex, None)
+            with self._lock:
+                self._entries.pop(user_id, None)
+
+        bump()
+        transaction.on_commit(bump)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация с кэшем пользователей.
+
+    Пользователь загружается вместе с профилем одним запросом и хранится
+    в UserCache, поэтому повторные запросы с тем же токеном обходятся
+    без обращений к БД за пользователем и профилем.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # Токены, отозванные при выходе, проверяются по памяти процесса
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and revocation_store.is_revoked(jti):
+            raise InvalidToken(_("Token is blacklisted"))
+
+        # Версия читается до загрузки из БД: если пользователь изменится
+        # в промежутке, запись окажется под старой версией и не будет
+        # использована
+        version = user_cache.get_version(user_id)
+        user = user_cache.get(user_id, version)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related("profile").get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, version, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from authentication.revocation import prune_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = "Удаляет записи об отозванных токенах, срок действия которых истек"
+
+    def handle(self, *args, **options):
+        deleted = prune_revoked_tokens()
+        self.stdout.write(self.style.SUCCESS(f"Удалено записей: {deleted}"))
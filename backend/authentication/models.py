@@ -1 +1,18 @@
 from django.db import models
+
+
+class RevokedToken(models.Model):
+    """Отозванный JWT: использованный при обновлении refresh-токен или выход"""
+
+    jti = models.CharField(max_length=255, unique=True, verbose_name="Идентификатор")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Истекает")
+    revoked_at = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name="Дата отзыва"
+    )
+
+    class Meta:
+        verbose_name = "Отозванный токен"
+        verbose_name_plural = "Отозванные токены"
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,129 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+
+# Синхронизация перечитывает отзывы с запасом: запись из долгой транзакции
+# может стать видна позже, чем ее revoked_at
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def revoked_token_key(jti):
+    return f"revoked_token:{jti}"
+
+
+class RevocationStore:
+    """
+    Отозванные токены.
+
+    Проверка идет по множеству в памяти процесса, затем по кэшу default,
+    без запросов к БД. Таблица RevokedToken хранит отзывы между
+    перезапусками: при первом обращении процесс загружает из нее все
+    действующие записи, а затем раз в TOKEN_REVOCATION_SYNC_INTERVAL
+    секунд дочитывает новые. С LocMemCache по умолчанию другие процессы
+    узнают об отзыве только при этой синхронизации; сразу - если кэш
+    общий (например, Redis). Истекшие токены отвергаются и без отзыва,
+    поэтому их записи удаляются из памяти при синхронизации и из таблицы
+    командой prune_revoked_tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # jti -> время истечения (timestamp)
+        self._tokens = {}
+        self._since = None
+        self._synced_at = None
+
+    @property
+    def sync_interval(self):
+        return getattr(settings, "TOKEN_REVOCATION_SYNC_INTERVAL", 30)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti in self._tokens:
+            return True
+        expires_at = cache.get(revoked_token_key(jti))
+        if expires_at is not None:
+            self._remember(jti, expires_at)
+            return True
+        return False
+
+    def revoke(self, jti, expires_at):
+        """
+        Отзыв токена с временем истечения expires_at (timestamp).
+
+        Возвращает False, если токен уже был отозван, в том числе
+        параллельным запросом в другом процессе: уникальность jti
+        проверяет БД.
+        """
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return True
+
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(
+                    jti=jti,
+                    expires_at=datetime.fromtimestamp(expires_at, tz=dt_timezone.utc),
+                )
+        except IntegrityError:
+            created = False
+        else:
+            created = True
+
+        self._remember(jti, expires_at)
+        cache.set(revoked_token_key(jti), expires_at, int(remaining) + 1)
+        return created
+
+    def revoke_token(self, token):
+        return self.revoke(token[api_settings.JTI_CLAIM], token["exp"])
+
+    def sync(self, force=False):
+        """Дочитывание новых отзывов из БД и удаление истекших из памяти"""
+        now = time.monotonic()
+        with self._lock:
+            if (
+                not force
+                and self._synced_at is not None
+                and now - self._synced_at < self.sync_interval
+            ):
+                return
+            self._synced_at = now
+            since = self._since
+
+        started = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=started)
+        if since is not None:
+            rows = rows.filter(revoked_at__gte=since)
+        rows = list(rows.values_list("jti", "expires_at"))
+        current = time.time()
+        with self._lock:
+            self._tokens = {
+                jti: expires_at
+                for jti, expires_at in self._tokens.items()
+                if expires_at > current
+            }
+            for jti, expires_at in rows:
+                self._tokens[jti] = expires_at.timestamp()
+            self._since = started - SYNC_OVERLAP
+
+    def _remember(self, jti, expires_at):
+        with self._lock:
+            self._tokens[jti] = expires_at
+
+
+revocation_store = RevocationStore()
+
+
+def prune_revoked_tokens():
+    """Удаление записей об истекших токенах; возвращает их число"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -1,7 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from baraholka.models import UserProfile
+from .revocation import revocation_store
 import re
 
 
@@ -131,3 +136,29 @@ class UserSerializer(serializers.ModelSerializer):
         profile.save()
 
         return instance
+
+
+class RevokingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление токенов с отзывом использованного refresh-токена.
+
+    Повторное предъявление уже обмененного токена (в том числе
+    одновременное из двух запросов) отклоняется.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        if revocation_store.is_revoked(refresh[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            if not revocation_store.revoke_token(refresh):
+                raise TokenError(_("Token is blacklisted"))
+
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
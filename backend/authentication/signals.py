@@ -0,0 +1,11 @@
+def invalidate_cached_user(sender, instance, **kwargs):
+    from .authentication import user_cache
+
+    user_cache.invalidate(instance.pk)
+
+
+def invalidate_cached_profile_user(sender, instance, **kwargs):
+    from .authentication import user_cache
+
+    # Профиль кэшируется вместе с пользователем
+    user_cache.invalidate(instance.user_id)
@@ -1 +1,130 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from baraholka.models import UserProfile
+
+from .authentication import user_cache, user_version_key
+from .models import RevokedToken
+from .revocation import prune_revoked_tokens
+
+
+REFRESH_URL = "/api/auth/token/refresh/"
+
+
+class TokenRevocationTests(TestCase):
+    """Отзыв использованных refresh-токенов и токенов при выходе"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="buyer", password="secret")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_reused_refresh_token_is_rejected(self):
+        refresh = str(RefreshToken.for_user(self.user))
+
+        response = self.client.post(REFRESH_URL, {"refresh": refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data["refresh"], refresh)
+
+        response = self.client.post(REFRESH_URL, {"refresh": refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logged_out_access_token_is_rejected(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 200)
+
+        response = self.client.post("/api/auth/logout/", {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+        self.client.credentials()
+        response = self.client.post(REFRESH_URL, {"refresh": str(refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_prune_deletes_only_expired_tokens(self):
+        now = timezone.now()
+        RevokedToken.objects.create(jti="expired", expires_at=now - timedelta(hours=1))
+        RevokedToken.objects.create(jti="active", expires_at=now + timedelta(hours=1))
+
+        self.assertEqual(prune_revoked_tokens(), 1)
+        self.assertQuerySetEqual(
+            RevokedToken.objects.values_list("jti", flat=True), ["active"]
+        )
+
+
+class ConcurrentRefreshTests(TransactionTestCase):
+    """Одновременные обновления одним refresh-токеном из разных потоков"""
+
+    def test_only_one_concurrent_refresh_succeeds(self):
+        user = User.objects.create_user(username="buyer", password="secret")
+        refresh = str(RefreshToken.for_user(user))
+        barrier = threading.Barrier(2)
+        statuses = []
+
+        def post():
+            try:
+                barrier.wait()
+                response = APIClient().post(REFRESH_URL, {"refresh": refresh})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [200, 401])
+
+
+class UserCacheTests(TestCase):
+    """Изменения пользователя видны при кэшированной аутентификации"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", password="secret")
+        UserProfile.objects.create(user=self.user, location="Москва")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # Первый запрос кладет пользователя в кэш
+        self.assertEqual(self.client.get("/api/auth/me/").data["location"], "Москва")
+
+    def test_profile_update_is_visible(self):
+        response = self.client.patch("/api/auth/me/", {"location": "Казань"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get("/api/auth/me/").data["location"], "Казань")
+
+        profile = UserProfile.objects.get(user=self.user)
+        profile.location = "Тверь"
+        profile.save()
+        self.assertEqual(self.client.get("/api/auth/me/").data["location"], "Тверь")
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/me/").status_code, 401)
+
+    def test_evicted_version_does_not_revive_stale_entry(self):
+        key = user_version_key(self.user.pk)
+        cache.delete(key)
+        self.client.get("/api/auth/me/")
+        # Копия пользователя, как у другого процесса с общим кэшем
+        stale = dict(user_cache._entries)
+        self.user.first_name = "Иван"
+        self.user.save()
+        user_cache._entries.update(stale)
+
+        cache.delete(key)
+        self.assertEqual(self.client.get("/api/auth/me/").data["first_name"], "Иван")
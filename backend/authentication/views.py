@@ -2,9 +2,12 @@ from django.shortcuts import render
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
+from .revocation import revocation_store
 from .serializers import RegisterSerializer, UserSerializer
 import logging
 
@@ -77,3 +80,25 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class LogoutView(APIView):
+    """
+    Выход: отзыв access-токена из заголовка и refresh-токена из тела
+    запроса, если он передан
+    """
+
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        if request.auth is not None:
+            revocation_store.revoke_token(request.auth)
+
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                revocation_store.revoke_token(RefreshToken(refresh))
+            except TokenError as error:
+                raise InvalidToken(error.args[0])
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
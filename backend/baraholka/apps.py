@@ -1,6 +1,39 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save, pre_migrate, pre_save
 
 
 class BaraholkaConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "baraholka"
+
+    def ready(self):
+        from .models import Category, Favorite, Product, ProductImage
+        from .signals import (
+            count_added_favorite,
+            create_postgres_extensions,
+            invalidate_category_tree,
+            invalidate_favorite_ids,
+            invalidate_product_image_lists,
+            invalidate_product_lists,
+            remember_product_category,
+            schedule_image_derivatives,
+            touch_product,
+            update_favorites_count,
+        )
+
+        pre_migrate.connect(create_postgres_extensions, sender=self)
+        post_save.connect(invalidate_category_tree, sender=Category)
+        post_delete.connect(invalidate_category_tree, sender=Category)
+        pre_save.connect(remember_product_category, sender=Product)
+        post_save.connect(invalidate_product_lists, sender=Product)
+        post_delete.connect(invalidate_product_lists, sender=Product)
+        post_save.connect(invalidate_product_image_lists, sender=ProductImage)
+        post_delete.connect(invalidate_product_image_lists, sender=ProductImage)
+        post_save.connect(touch_product, sender=ProductImage)
+        post_delete.connect(touch_product, sender=ProductImage)
+        post_save.connect(schedule_image_derivatives, sender=ProductImage)
+        post_save.connect(invalidate_favorite_ids, sender=Favorite)
+        post_delete.connect(invalidate_favorite_ids, sender=Favorite)
+        post_save.connect(update_favorites_count, sender=Favorite)
+        post_delete.connect(update_favorites_count, sender=Favorite)
+        post_save.connect(count_added_favorite, sender=Favorite)
@@ -0,0 +1,612 @@
+import json
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count, F
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .favorites import recount_favorites, toggle_favorite
+from .models import (
+    Category,
+    Chat,
+    Favorite,
+    Message,
+    Product,
+    ProductView,
+    UserProfile,
+)
+from .stats import rollup_product_views
+from .view_counter import product_views
+
+
+# Все пользователи нагрузочного набора начинаются с этого префикса,
+# по нему же набор удаляется
+BENCHMARK_USER_PREFIX = "bench_"
+BENCHMARK_PASSWORD = "benchmark"
+BENCHMARK_MESSAGE = "Нагрузочное сообщение"
+
+TITLE_NOUNS = (
+    "Велосипед",
+    "Телефон",
+    "Ноутбук",
+    "Диван",
+    "Куртка",
+    "Кроссовки",
+    "Холодильник",
+    "Телевизор",
+    "Коляска",
+    "Гитара",
+    "Палатка",
+    "Книга",
+)
+TITLE_ADJECTIVES = (
+    "новый",
+    "почти новый",
+    "красный",
+    "черный",
+    "детский",
+    "складной",
+    "большой",
+    "компактный",
+)
+LOCATIONS = ("Екатеринбург", "Москва", "Пермь", "Челябинск", "Тюмень", "Казань")
+SEARCH_TERMS = ("велосипед", "телефон", "диван детский", "куртка", "гитара")
+
+PERCENTILES = (50, 95, 99)
+# Число запросов к БД у сценариев с записью немного плавает от состояния
+# данных, поэтому регрессией считается рост больше чем на ползапроса
+QUERIES_TOLERANCE = 0.5
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Отключение auto_now/auto_now_add, чтобы задать даты в прошлом"""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BenchmarkSeeder:
+    """
+    Генератор нагрузочного набора данных.
+
+    Объекты создаются ленивыми генераторами и вставляются пачками через
+    bulk_create, поэтому память не растет с размером набора. Случайные
+    значения берутся из генератора с фиксированным seed, и набор
+    воспроизводим.
+    """
+
+    def __init__(self, seed=42, batch_size=5000, log=print):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        # Метка запуска делает slug уникальными между повторными запусками
+        self.run = uuid.UUID(int=self.random.getrandbits(128)).hex[:6]
+        self.now = timezone.now()
+
+    def seed(self, users, products, views, favorites, chats, messages_per_chat):
+        categories = self.get_categories()
+        user_ids = self.create_users(users)
+        product_ids = self.create_products(products, categories, user_ids)
+        self.create_views(views, product_ids, user_ids)
+        self.create_favorites(favorites, product_ids, user_ids)
+        self.create_chats(chats, messages_per_chat, product_ids, user_ids)
+
+        self.log("Сворачивание просмотров и пересчет избранного")
+        rollup_product_views()
+        recount_favorites()
+
+    def insert(self, model, objects, label, total, **kwargs):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size, **kwargs)
+            created += len(batch)
+            self.log(f"{label}: {created}/{total}")
+
+    def random_past(self, days):
+        return self.now - timedelta(seconds=self.random.uniform(0, days * 86400))
+
+    def get_categories(self):
+        categories = list(Category.objects.only("id", "parent_id", "path"))
+        if not categories:
+            raise ValueError(
+                "Нет категорий: загрузите baraholka/fixtures/categories.json"
+            )
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+        return [(root, children.get(root.pk, [])) for root in children.get(None, [])]
+
+    def create_users(self, count):
+        password = make_password(BENCHMARK_PASSWORD)
+        start = User.objects.filter(username__startswith=BENCHMARK_USER_PREFIX).count()
+        usernames = [
+            f"{BENCHMARK_USER_PREFIX}{self.run}_{number}"
+            for number in range(start, start + count)
+        ]
+        self.insert(
+            User,
+            (User(username=username, password=password) for username in usernames),
+            "Пользователи",
+            count,
+        )
+        users = list(
+            User.objects.filter(username__in=usernames).values_list("pk", flat=True)
+        )
+        self.insert(
+            UserProfile,
+            (
+                UserProfile(user_id=user_id, location=self.random.choice(LOCATIONS))
+                for user_id in users
+            ),
+            "Профили",
+            count,
+        )
+        return users
+
+    def generate_products(self, count, categories, user_ids):
+        for number in range(count):
+            category, subcategories = self.random.choice(categories)
+            subcategory = (
+                self.random.choice(subcategories)
+                if subcategories and self.random.random() < 0.8
+                else None
+            )
+            created_at = self.random_past(365)
+            title = (
+                f"{self.random.choice(TITLE_NOUNS)} "
+                f"{self.random.choice(TITLE_ADJECTIVES)}"
+            )
+            yield Product(
+                title=title,
+                description=f"{title}, отличное состояние, самовывоз",
+                price=self.random.randint(100, 200000),
+                category_id=category.pk,
+                subcategory_id=subcategory and subcategory.pk,
+                category_path=(subcategory or category).path,
+                seller_id=self.random.choice(user_ids),
+                condition=self.random.choice(("new", "used")),
+                status=self.random.choices(
+                    ("active", "sold", "archived"), weights=(85, 10, 5)
+                )[0],
+                location=self.random.choice(LOCATIONS),
+                created_at=created_at,
+                updated_at=created_at,
+                slug=f"bench-{self.run}-{number}",
+            )
+
+    def create_products(self, count, categories, user_ids):
+        with manual_timestamps(Product):
+            self.insert(
+                Product,
+                self.generate_products(count, categories, user_ids),
+                "Товары",
+                count,
+            )
+        return list(
+            Product.objects.filter(slug__startswith=f"bench-{self.run}-").values_list(
+                "pk", flat=True
+            )
+        )
+
+    def create_views(self, count, product_ids, user_ids):
+        views = (
+            ProductView(
+                product_id=self.random.choice(product_ids),
+                user_id=(
+                    self.random.choice(user_ids) if self.random.random() < 0.5 else None
+                ),
+                ip_address=f"10.{self.random.randint(0, 255)}.{self.random.randint(0, 255)}.1",
+                viewed_at=self.random_past(30),
+            )
+            for _ in range(count)
+        )
+        with manual_timestamps(ProductView):
+            self.insert(ProductView, views, "Просмотры", count)
+
+    def create_favorites(self, count, product_ids, user_ids):
+        favorites = (
+            Favorite(
+                user_id=self.random.choice(user_ids),
+                product_id=self.random.choice(product_ids),
+            )
+            for _ in range(count)
+        )
+        # Случайные пары могут повторяться
+        self.insert(Favorite, favorites, "Избранное", count, ignore_conflicts=True)
+
+    def create_chats(self, count, messages_per_chat, product_ids, user_ids):
+        sellers = dict(
+            Product.objects.filter(pk__in=product_ids).values_list("pk", "seller_id")
+        )
+        participants = []
+        chats = []
+        for _ in range(count):
+            product_id = self.random.choice(product_ids)
+            buyer_id = self.random.choice(user_ids)
+            if buyer_id == sellers[product_id]:
+                continue
+            chats.append(Chat(product_id=product_id, created_at=self.random_past(60)))
+            participants.append((buyer_id, sellers[product_id]))
+
+        with manual_timestamps(Chat, Message):
+            created = []
+            for batch in batched(chats, self.batch_size):
+                created.extend(Chat.objects.bulk_create(batch))
+                self.log(f"Чаты: {len(created)}/{len(chats)}")
+
+            Participant = Chat.participants.through
+            self.insert(
+                Participant,
+                (
+                    Participant(chat_id=chat.pk, user_id=user_id)
+                    for chat, users in zip(created, participants)
+                    for user_id in users
+                ),
+                "Участники чатов",
+                len(created) * 2,
+            )
+            self.insert(
+                Message,
+                self.generate_messages(created, participants, messages_per_chat),
+                "Сообщения",
+                len(created) * messages_per_chat,
+            )
+
+    def generate_messages(self, chats, participants, messages_per_chat):
+        for chat, users in zip(chats, participants):
+            sent_at = chat.created_at
+            for number in range(messages_per_chat):
+                sent_at += timedelta(minutes=self.random.randint(1, 600))
+                yield Message(
+                    chat_id=chat.pk,
+                    sender_id=users[number % 2],
+                    text=f"Сообщение {number + 1}: товар еще продается?",
+                    created_at=min(sent_at, self.now),
+                    # Последние сообщения чата еще не прочитаны
+                    is_read=number < messages_per_chat - 2,
+                )
+
+
+def clear_benchmark_data():
+    """Удаление пользователей набора вместе со всеми их данными"""
+    return User.objects.filter(username__startswith=BENCHMARK_USER_PREFIX).delete()
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, queries, errors, elapsed):
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(statistics.fmean(latencies), 2),
+    }
+    for percent in PERCENTILES:
+        result[f"p{percent}_ms"] = round(percentile(latencies, percent), 2)
+    if queries is not None:
+        result["queries_per_request"] = round(statistics.fmean(queries), 2)
+    return result
+
+
+class BenchmarkRunner:
+    """
+    Прогон ключевых сценариев API.
+
+    Без base_url запросы выполняются в процессе через тестовый клиент
+    Django со всеми middleware, и можно посчитать запросы к БД на каждый
+    запрос. С base_url запросы идут на запущенный сервер из нескольких
+    потоков; запросы к БД тогда не считаются.
+
+    Сценарии работают только с товарами и пользователями набора
+    seed_benchmark. Изменения сценариев с записью (сообщения, просмотры,
+    избранное) после прогона отменяются.
+    """
+
+    def __init__(
+        self,
+        requests=200,
+        warmup=20,
+        concurrency=1,
+        base_url=None,
+        host="localhost",
+        seed=42,
+    ):
+        self.requests = requests
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.host = host
+        self.random = random.Random(seed)
+        # Пары (id пользователя, slug товара) сценария favorite_toggle
+        self.toggled = set()
+
+    def load_fixtures(self):
+        """Выборка товаров, пользователей и чатов для сценариев"""
+        products = list(
+            Product.objects.filter(
+                status="active", seller__username__startswith=BENCHMARK_USER_PREFIX
+            )
+            .order_by("-created_at")
+            .values_list("slug", "category_id")[:1000]
+        )
+        chats = list(
+            Chat.participants.through.objects.filter(
+                user__username__startswith=BENCHMARK_USER_PREFIX
+            )
+            .order_by("-chat_id")
+            .values_list("chat_id", "user_id")[:500]
+        )
+        if not products or not chats:
+            raise ValueError("Нет данных для сценариев: выполните seed_benchmark")
+
+        users = {
+            user.pk: user for user in User.objects.filter(pk__in={u for _, u in chats})
+        }
+        self.products = products
+        self.chats = [(chat_id, users[user_id]) for chat_id, user_id in chats]
+        self.tokens = {
+            user_id: str(AccessToken.for_user(user)) for user_id, user in users.items()
+        }
+
+    def scenarios(self):
+        return {
+            "product_list": self.product_list,
+            "product_list_anonymous": self.product_list_anonymous,
+            "product_search": self.product_search,
+            "product_detail": self.product_detail,
+            "chat_inbox": self.chat_inbox,
+            "message_send": self.message_send,
+            "favorite_toggle": self.favorite_toggle,
+        }
+
+    # Сценарий возвращает (метод, путь, тело, id пользователя или None)
+
+    def random_user_id(self):
+        return self.random.choice(self.chats)[1].pk
+
+    def product_list(self):
+        params = self.random.choice(
+            (
+                "",
+                "?ordering=price&minPrice=1000&maxPrice=50000",
+                "?ordering=-views_count",
+                f"?category={self.random.choice(self.products)[1]}",
+                "?pagination=cursor",
+            )
+        )
+        return "GET", f"/api/products/{params}", None, self.random_user_id()
+
+    def product_list_anonymous(self):
+        # Первые страницы ленты почти всегда отдаются из кэша
+        page = self.random.choice((1, 1, 1, 2, 3))
+        return "GET", f"/api/products/?page={page}", None, None
+
+    def product_search(self):
+        term = self.random.choice(SEARCH_TERMS)
+        return "GET", f"/api/products/?search={term}", None, self.random_user_id()
+
+    def product_detail(self):
+        slug = self.random.choice(self.products)[0]
+        return "GET", f"/api/products/{slug}/", None, self.random_user_id()
+
+    def chat_inbox(self):
+        return "GET", "/api/chats/", None, self.random_user_id()
+
+    def message_send(self):
+        chat_id, user = self.random.choice(self.chats)
+        body = {"text": BENCHMARK_MESSAGE}
+        return "POST", f"/api/chats/{chat_id}/messages/", body, user.pk
+
+    def favorite_toggle(self):
+        slug = self.random.choice(self.products)[0]
+        user_id = self.random_user_id()
+        self.toggled.add((user_id, slug))
+        path = f"/api/products/{slug}/toggle_favorite/"
+        return "POST", path, None, user_id
+
+    def run(self, names=None):
+        self.load_fixtures()
+        scenarios = self.scenarios()
+        plans = {
+            name: [scenarios[name]() for _ in range(self.warmup + self.requests)]
+            for name in names or scenarios
+        }
+        favorites = self.get_favorites()
+        started = timezone.now()
+        results = {}
+        try:
+            for name, plan in plans.items():
+                results[name] = self.run_scenario(plan)
+        finally:
+            self.cleanup(started, favorites, "product_detail" in plans)
+        return results
+
+    def get_favorites(self):
+        """Пары сценария favorite_toggle, которые сейчас в избранном"""
+        if not self.toggled:
+            return set()
+        favorites = Favorite.objects.filter(
+            user_id__in={user_id for user_id, _ in self.toggled},
+            product__slug__in={slug for _, slug in self.toggled},
+        ).values_list("user_id", "product__slug")
+        return set(favorites) & self.toggled
+
+    def cleanup(self, started, favorites, viewed):
+        """Отмена изменений, сделанных сценариями с записью"""
+        Message.objects.filter(
+            sender__username__startswith=BENCHMARK_USER_PREFIX,
+            text=BENCHMARK_MESSAGE,
+            created_at__gte=started,
+        ).delete()
+
+        # Избранное возвращается к прежнему состоянию тем же переключением
+        changed = favorites ^ self.get_favorites()
+        if changed:
+            users = User.objects.in_bulk({user_id for user_id, _ in changed})
+            products = Product.objects.in_bulk(
+                {slug for _, slug in changed}, field_name="slug"
+            )
+            for user_id, slug in changed:
+                toggle_favorite(users[user_id], products[slug])
+
+        if viewed:
+            # Просмотры записываются из буфера с задержкой: в процессе их
+            # можно записать сразу, а сервер надо подождать
+            if self.base_url:
+                time.sleep(getattr(settings, "PRODUCT_VIEWS_FLUSH_INTERVAL", 10))
+            else:
+                product_views.flush()
+        views = ProductView.objects.filter(
+            viewed_at__gte=started,
+            product__seller__username__startswith=BENCHMARK_USER_PREFIX,
+        )
+        counts = views.order_by().values("product_id").annotate(count=Count("id"))
+        for row in counts:
+            Product.objects.filter(pk=row["product_id"]).update(
+                views_count=F("views_count") - row["count"]
+            )
+        views.delete()
+
+    def run_scenario(self, plan):
+        for request in plan[: self.warmup]:
+            self.execute(request)
+
+        measured = plan[self.warmup :]
+        started = time.perf_counter()
+        if self.base_url and self.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                samples = list(executor.map(self.execute, measured))
+        else:
+            samples = [self.execute(request) for request in measured]
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, _, _ in samples]
+        errors = sum(1 for _, status_code, _ in samples if status_code >= 400)
+        queries = None if self.base_url else [count for _, _, count in samples]
+        return summarize(latencies, queries, errors, elapsed)
+
+    def execute(self, request):
+        """Выполнение запроса: (задержка в мс, код ответа, запросов к БД)"""
+        method, path, body, user_id = request
+        headers = {"Content-Type": "application/json"}
+        if user_id is not None:
+            headers["Authorization"] = f"Bearer {self.tokens[user_id]}"
+        data = json.dumps(body).encode() if body is not None else None
+
+        if self.base_url:
+            return self.execute_http(method, path, data, headers)
+        return self.execute_local(method, path, data, headers)
+
+    def execute_http(self, method, path, data, headers):
+        http_request = Request(
+            self.base_url + path, data=data, headers=headers, method=method
+        )
+        started = time.perf_counter()
+        try:
+            with urlopen(http_request) as response:
+                response.read()
+                status_code = response.status
+        except HTTPError as error:
+            status_code = error.code
+        return (time.perf_counter() - started) * 1000, status_code, None
+
+    def execute_local(self, method, path, data, headers):
+        counter = QueryCounter()
+        client = Client(HTTP_HOST=self.host)
+        extra = {}
+        if "Authorization" in headers:
+            extra["HTTP_AUTHORIZATION"] = headers["Authorization"]
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = client.generic(
+                method,
+                path,
+                data or b"",
+                content_type=headers["Content-Type"],
+                **extra,
+            )
+        latency = (time.perf_counter() - started) * 1000
+        return latency, response.status_code, counter.count
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def compare(results, baseline, max_regression):
+    """
+    Сравнение с эталоном: список строк отчета и признак регрессии.
+
+    Регрессией считается рост p95 больше чем на max_regression процентов
+    или рост числа запросов к БД на запрос больше QUERIES_TOLERANCE.
+    """
+    lines = []
+    regressed = False
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            lines.append(f"{name}: нет в эталоне")
+            continue
+
+        change = (result["p95_ms"] - reference["p95_ms"]) / reference["p95_ms"] * 100
+        line = f"{name}: p95 {reference['p95_ms']} -> {result['p95_ms']} мс ({change:+.0f}%)"
+        problems = []
+        if change > max_regression:
+            problems.append("задержка")
+        queries = result.get("queries_per_request")
+        reference_queries = reference.get("queries_per_request")
+        if queries is not None and reference_queries is not None:
+            line += f", запросов к БД {reference_queries} -> {queries}"
+            if queries > reference_queries + QUERIES_TOLERANCE:
+                problems.append("запросы к БД")
+        if problems:
+            regressed = True
+            line += f"  РЕГРЕССИЯ: {', '.join(problems)}"
+        lines.append(line)
+    return lines, regressed
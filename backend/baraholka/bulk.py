@@ -0,0 +1,291 @@
+import csv
+import io
+import itertools
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+from rest_framework import serializers
+
+from .list_cache import product_list_cache
+from .models import Category, Product
+
+
+IMPORT_BATCH_SIZE = 500
+# Сколько раз пачка вставляется при гонке за slug
+SLUG_ATTEMPTS = 3
+EXPORT_CHUNK_SIZE = 2000
+# Дальше ошибки только считаются, чтобы отчет не рос вместе с файлом
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("jsonl", "csv")
+CONTENT_TYPES = {"jsonl": "application/x-ndjson", "csv": "text/csv"}
+
+IMPORT_FIELDS = (
+    "title",
+    "description",
+    "price",
+    "category",
+    "subcategory",
+    "condition",
+    "status",
+    "location",
+)
+EXPORT_FIELDS = ("slug", *IMPORT_FIELDS, "views_count", "created_at", "updated_at")
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """Строка импорта; категории указываются slug и ищутся в карте из контекста"""
+
+    category = serializers.CharField()
+    subcategory = serializers.CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Product
+        fields = IMPORT_FIELDS
+
+    def validate_category(self, value):
+        return self.get_category(value)
+
+    def validate_subcategory(self, value):
+        return self.get_category(value) if value else None
+
+    def get_category(self, slug):
+        category = self.context["categories"].get(slug)
+        if category is None:
+            raise serializers.ValidationError(f"Категория {slug} не найдена")
+        return category
+
+    def validate(self, data):
+        category = data["category"]
+        subcategory = data.get("subcategory")
+        if subcategory and (
+            subcategory == category or not subcategory.path.startswith(category.path)
+        ):
+            raise serializers.ValidationError(
+                {
+                    "subcategory": [
+                        "Подкатегория должна принадлежать выбранной категории"
+                    ]
+                }
+            )
+        return data
+
+
+def read_rows(stream, file_format):
+    """
+    Строки файла импорта: (номер строки, словарь или None, ошибка)
+
+    stream - текстовый поток; файл читается построчно, целиком в память
+    он не загружается.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Пустые ячейки CSV считаются незаполненными полями
+            yield reader.line_num, {
+                key: value for key, value in row.items() if key and value != ""
+            }, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, f"Некорректный JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Строка должна быть JSON-объектом"
+            continue
+        yield line_number, row, None
+
+
+def unique_slugs(products, force_suffix=False):
+    """
+    Уникальные slug для пачки товаров одним запросом к БД: при совпадении
+    с существующим или соседним в пачке добавляется случайный суффикс.
+    С force_suffix суффикс добавляется всегда - при повторной вставке,
+    когда slug успели занять параллельно.
+    """
+    bases = [(slugify(product.title) or "product")[:50] for product in products]
+    taken = set(
+        Product.objects.filter(slug__in=bases)
+        .order_by()
+        .values_list("slug", flat=True)
+    )
+    for product, base in zip(products, bases):
+        slug = base
+        if force_suffix or slug in taken:
+            slug = f"{base[:41]}-{uuid.uuid4().hex[:8]}"
+        taken.add(slug)
+        product.slug = slug
+
+
+class ProductImporter:
+    """
+    Импорт товаров продавца пачками.
+
+    Строки проверяются сериализатором без запросов к БД (категории
+    берутся из заранее загруженной карты по slug), а пачка проверенных
+    строк вставляется одним bulk_create в своей транзакции. Ошибочные
+    строки пропускаются и попадают в отчет с номером строки.
+    """
+
+    def __init__(self, seller, batch_size=IMPORT_BATCH_SIZE):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.categories = {
+            category.slug: category
+            for category in Category.objects.only("id", "slug", "path")
+        }
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, stream, file_format):
+        # Один экземпляр сериализатора на весь файл: поля строятся один раз
+        validator = ProductImportSerializer(context={"categories": self.categories})
+        batch = []
+        for line_number, row, error in read_rows(stream, file_format):
+            if error is not None:
+                self.add_error(line_number, error)
+                continue
+            try:
+                data = validator.run_validation(row)
+            except serializers.ValidationError as error:
+                self.add_error(line_number, error.detail)
+                continue
+
+            product = Product(seller=self.seller, **data)
+            # bulk_create не вызывает Product.save, поэтому путь задается здесь
+            product.category_path = (product.subcategory or product.category).path
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                self.create_batch(batch)
+                batch = []
+        if batch:
+            self.create_batch(batch)
+        return self.report()
+
+    def create_batch(self, products):
+        # Между проверкой slug и вставкой их может занять параллельный
+        # импорт или создание товара: тогда пачка вставляется заново
+        # с новыми случайными суффиксами
+        for attempt in range(SLUG_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    unique_slugs(products, force_suffix=attempt > 0)
+                    Product.objects.bulk_create(products)
+                    paths = {product.category_path for product in products}
+                    # Сигналы post_save при bulk_create не отправляются
+                    transaction.on_commit(lambda: product_list_cache.invalidate(*paths))
+                break
+            except IntegrityError:
+                if attempt == SLUG_ATTEMPTS - 1:
+                    raise
+        self.created += len(products)
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "errors": errors})
+
+    def report(self):
+        return {
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def export_products(queryset, file_format):
+    """
+    Построчная выгрузка товаров в JSONL или CSV.
+
+    Строки читаются через iterator(), в PostgreSQL - серверным курсором,
+    поэтому потребление памяти не зависит от размера выгрузки.
+    """
+    rows = (
+        queryset.order_by("pk")
+        .values_list(
+            "slug",
+            "title",
+            "description",
+            "price",
+            "category__slug",
+            "subcategory__slug",
+            "condition",
+            "status",
+            "location",
+            "views_count",
+            "created_at",
+            "updated_at",
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(
+                ["" if value is None else format_value(value) for value in row]
+            )
+        return
+
+    for row in rows:
+        data = dict(zip(EXPORT_FIELDS, (format_value(value) for value in row)))
+        yield json.dumps(data, ensure_ascii=False) + "\n"
+
+
+async def aiter_lines(lines, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Выгрузка для ASGI.
+
+    Синхронный итератор Django под ASGI целиком собирает в список перед
+    отправкой, поэтому строки читаются порциями через sync_to_async - в
+    потоке синхронного кода, где открыт курсор БД.
+    """
+    next_chunk = sync_to_async(lambda: "".join(itertools.islice(lines, chunk_size)))
+    try:
+        while True:
+            chunk = await next_chunk()
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        # Клиент мог оборвать загрузку: курсор закрывается в том же потоке
+        await sync_to_async(lines.close)()
+
+
+def format_value(value):
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def open_text(binary_file):
+    """Текстовый поток поверх загруженного файла; BOM из Excel отбрасывается"""
+    return io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+
+
+def guess_format(filename, default="jsonl"):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in FORMATS:
+        return extension
+    if extension in ("json", "ndjson"):
+        return "jsonl"
+    return default
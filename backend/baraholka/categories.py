@@ -0,0 +1,114 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+from .serializers import CategorySerializer
+from .utils import make_etag
+
+
+CATEGORY_TREE_VERSION_KEY = "category_tree_version"
+
+
+class CategoryTreeCache:
+    """
+    Дерево категорий, закэшированное в памяти процесса.
+
+    Актуальность проверяется по версии в кэше default: изменение
+    категории меняет версию, и процесс перестраивает дерево при следующем
+    обращении. Кэш default локален для процесса, поэтому версия живет
+    CATEGORY_TREE_CACHE_TIMEOUT секунд: остальные процессы получают новую
+    версию и перечитывают категории не позже этого срока (с общим кэшем,
+    например Redis, - сразу). В остальное время чтение не делает
+    запросов к БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+        self._paths = None
+
+    @property
+    def timeout(self):
+        return getattr(settings, "CATEGORY_TREE_CACHE_TIMEOUT", 60)
+
+    def get_version(self):
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(CATEGORY_TREE_VERSION_KEY, version, self.timeout):
+                version = cache.get(CATEGORY_TREE_VERSION_KEY, version)
+        return version
+
+    def invalidate(self):
+        # Новое случайное значение, а не счетчик: после вытеснения ключа
+        # из кэша версия не может совпасть со старой
+        cache.set(CATEGORY_TREE_VERSION_KEY, uuid.uuid4().hex, self.timeout)
+
+    def get(self, request):
+        """Плоский список (list) и дерево (tree) категорий с их ETag"""
+        version = self.get_version()
+        # Ссылки на иконки абсолютные и зависят от адреса запроса
+        base_url = request.build_absolute_uri("/")
+
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(base_url)
+        if entry is not None:
+            return entry
+
+        entry = self.build(request, version, base_url)
+        with self._lock:
+            if self._version == version:
+                self._entries[base_url] = entry
+        return entry
+
+    def get_paths(self):
+        """Материализованные пути категорий по id"""
+        version = self.get_version()
+        with self._lock:
+            self._check_version(version)
+            paths = self._paths
+        if paths is not None:
+            return paths
+
+        paths = dict(Category.objects.values_list("id", "path"))
+        with self._lock:
+            if self._version == version:
+                self._paths = paths
+        return paths
+
+    def _check_version(self, version):
+        if self._version != version:
+            self._version = version
+            self._entries = {}
+            self._paths = None
+
+    def build(self, request, version, base_url):
+        categories = list(Category.objects.all().order_by("name"))
+        flat = CategorySerializer(
+            categories, many=True, context={"request": request}
+        ).data
+
+        nodes = {item["id"]: {**item, "children": []} for item in flat}
+        tree = []
+        for item in flat:
+            node = nodes[item["id"]]
+            parent = nodes.get(item["parent"])
+            if parent is not None:
+                parent["children"].append(node)
+            else:
+                tree.append(node)
+
+        return {
+            "list": flat,
+            "list_etag": make_etag("categories", version, base_url),
+            "tree": tree,
+            "tree_etag": make_etag("category_tree", version, base_url),
+        }
+
+
+category_tree = CategoryTreeCache()
@@ -0,0 +1,133 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Favorite, Product
+from .stats import increment_daily_stat
+
+
+# Кэш default локален для процесса, и сброс при изменении избранного
+# другие процессы не видят: срок ограничивает, сколько они могут отдавать
+# устаревший is_favorite и ETag. Его хватает, чтобы страница ленты и
+# последующие запросы пользователя обходились без запросов к БД
+FAVORITE_IDS_CACHE_TIMEOUT = 30
+
+# Переключение избранного одним запросом: удаление существующей записи
+# либо вставка новой (ON CONFLICT защищает от двойного клика) вместе
+# с изменением счетчика товара
+TOGGLE_FAVORITE_SQL = """
+WITH deleted AS (
+    DELETE FROM {favorite}
+    WHERE user_id = %(user_id)s AND product_id = %(product_id)s
+    RETURNING product_id
+), inserted AS (
+    INSERT INTO {favorite} (user_id, product_id, created_at)
+    SELECT %(user_id)s, %(product_id)s, %(now)s
+    WHERE %(can_add)s AND NOT EXISTS (SELECT 1 FROM deleted)
+    ON CONFLICT (user_id, product_id) DO NOTHING
+    RETURNING product_id
+), counted AS (
+    UPDATE {product}
+    -- Счетчик не уходит ниже нуля, даже если еще не пересчитан
+    -- после добавления поля (recount_favorites)
+    SET favorites_count = GREATEST(
+        favorites_count
+        + (SELECT count(*) FROM inserted)
+        - (SELECT count(*) FROM deleted),
+        0
+    )
+    WHERE id = %(product_id)s
+        AND EXISTS (SELECT 1 FROM deleted UNION ALL SELECT 1 FROM inserted)
+    RETURNING favorites_count
+)
+SELECT
+    EXISTS (SELECT 1 FROM deleted),
+    EXISTS (SELECT 1 FROM inserted),
+    (SELECT favorites_count FROM counted)
+"""
+
+
+def favorite_ids_key(user_id):
+    return f"favorite_ids:{user_id}"
+
+
+def get_favorite_ids(user):
+    """
+    Множество id избранных товаров пользователя.
+
+    Хранится в кэше до изменения избранного, но не дольше
+    FAVORITE_IDS_CACHE_TIMEOUT секунд, поэтому признак is_favorite для
+    целой страницы товаров проверяется без запросов к БД.
+    """
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    key = favorite_ids_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(
+            Favorite.objects.filter(user=user).values_list("product_id", flat=True)
+        )
+        cache.set(key, ids, FAVORITE_IDS_CACHE_TIMEOUT)
+    return frozenset(ids)
+
+
+def invalidate_favorite_ids(user_id):
+    # Сброс и сразу, и после фиксации: иначе параллельный запрос может
+    # успеть закэшировать состояние до коммита
+    key = favorite_ids_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def toggle_favorite(user, product):
+    """
+    Добавление товара в избранное или удаление из него.
+
+    Возвращает (в избранном ли товар теперь, изменилось ли что-то,
+    новое значение favorites_count или None). Неактивный товар можно
+    только убрать из избранного.
+    """
+    sql = TOGGLE_FAVORITE_SQL.format(
+        favorite=connection.ops.quote_name(Favorite._meta.db_table),
+        product=connection.ops.quote_name(Product._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql,
+            {
+                "user_id": user.pk,
+                "product_id": product.pk,
+                "now": timezone.now(),
+                "can_add": product.status == "active",
+            },
+        )
+        deleted, inserted, favorites_count = cursor.fetchone()
+
+    # Сырой SQL не отправляет сигналы Favorite
+    if deleted or inserted:
+        invalidate_favorite_ids(user.pk)
+    if inserted:
+        increment_daily_stat(product.pk, "favorites_added")
+
+    if deleted:
+        return False, True, favorites_count
+    if inserted:
+        return True, True, favorites_count
+    # Ничего не изменилось: товар неактивен или его только что добавил
+    # параллельный запрос того же пользователя
+    return product.status == "active", False, None
+
+
+def recount_favorites():
+    """Пересчет favorites_count всех товаров по таблице Favorite"""
+    counts = (
+        Favorite.objects.filter(product=OuterRef("pk"))
+        .order_by()
+        .values("product")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Product.objects.update(favorites_count=Coalesce(Subquery(counts), 0))
@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
+from rest_framework import filters
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """Полнотекстовый поиск по индексированному поисковому вектору товара"""
+
+    search_config = "russian"
+
+    def get_search_query(self, request):
+        query = request.query_params.get(self.search_param, "")
+        return query.replace("\x00", "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        search_query = self.get_search_query(request)
+        if not search_query:
+            return queryset
+
+        query = SearchQuery(
+            search_query, config=self.search_config, search_type="websearch"
+        )
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F("search_vector"), query)
+        )
+
+        # Если сортировка не задана явно, сначала показываем наиболее релевантные
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by("-search_rank", *queryset.query.order_by)
+
+        return queryset
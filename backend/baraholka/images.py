@@ -0,0 +1,215 @@
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .list_cache import product_list_cache
+from .models import Product, ProductImage
+
+
+logger = logging.getLogger("baraholka")
+
+
+class ImageDerivatives:
+    """
+    Миниатюры и сжатые WebP-копии изображений товаров.
+
+    Исходный файл сохраняется как есть, а производные создаются пулом
+    потоков после фиксации транзакции, поэтому загрузка не ждет
+    перекодирования. Пока копий нет, сериализаторы отдают оригинал.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def workers(self):
+        return getattr(settings, "PRODUCT_IMAGE_WORKERS", 2)
+
+    @property
+    def quality(self):
+        return getattr(settings, "PRODUCT_IMAGE_WEBP_QUALITY", 80)
+
+    @property
+    def sizes(self):
+        return {
+            "thumbnail": getattr(settings, "PRODUCT_IMAGE_THUMBNAIL_SIZE", 400),
+            "webp": getattr(settings, "PRODUCT_IMAGE_LARGE_SIZE", 1600),
+        }
+
+    def schedule(self, image_id):
+        """Постановка изображения в очередь после фиксации транзакции"""
+        transaction.on_commit(lambda: self.submit(image_id))
+
+    def submit(self, image_id):
+        if not self.workers:
+            self.generate(image_id)
+            return
+        self._get_executor().submit(self._run, image_id)
+
+    def generate(self, image_id):
+        """Создание производных изображения; возвращает False, если его нет"""
+        product_image = ProductImage.objects.filter(pk=image_id).first()
+        if product_image is None or not product_image.image:
+            return False
+
+        with product_image.image.open("rb") as source:
+            original = Image.open(source)
+            original.load()
+        # Учитываем поворот из EXIF, сами метаданные в копии не переносятся
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ("RGB", "RGBA"):
+            original = original.convert(
+                "RGBA" if "transparency" in original.info else "RGB"
+            )
+
+        name = os.path.splitext(os.path.basename(product_image.image.name))[0]
+        for field, size in self.sizes.items():
+            copy = original.copy()
+            copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            copy.save(buffer, "WEBP", quality=self.quality, method=4)
+            old_file = getattr(product_image, field)
+            if old_file:
+                old_file.delete(save=False)
+            getattr(product_image, field).save(
+                f"{name}.webp", ContentFile(buffer.getvalue()), save=False
+            )
+
+        try:
+            product_image.save(update_fields=list(self.sizes))
+        except DatabaseError:
+            # Изображение удалили, пока шла обработка
+            for field in self.sizes:
+                getattr(product_image, field).delete(save=False)
+            return False
+        return True
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="product-images"
+                )
+            return self._executor
+
+    def _run(self, image_id):
+        try:
+            self.generate(image_id)
+        except Exception:
+            logger.exception("Ошибка обработки изображения товара %s", image_id)
+        finally:
+            connection.close()
+
+
+image_derivatives = ImageDerivatives()
+
+
+def images_changed(product):
+    """
+    Обновление updated_at и кэша списков после массовых операций
+    с изображениями: bulk_create и bulk_update не отправляют сигналы
+    """
+    Product.objects.filter(pk=product.pk).update(updated_at=timezone.now())
+    path = product.category_path
+    transaction.on_commit(lambda: product_list_cache.invalidate(path))
+
+
+@transaction.atomic
+def add_product_images(product, files):
+    """Добавление изображений в конец галереи одной вставкой"""
+    last_order = product.images.aggregate(last=Max("order"))["last"]
+    start = 0 if last_order is None else last_order + 1
+    images = ProductImage.objects.bulk_create(
+        [
+            ProductImage(product=product, image=file, order=start + offset)
+            for offset, file in enumerate(files)
+        ]
+    )
+    for image in images:
+        image_derivatives.schedule(image.pk)
+    images_changed(product)
+    return images
+
+
+@transaction.atomic
+def remove_product_images(product, image_ids):
+    """
+    Удаление изображений товара по id.
+
+    Файлы остаются в хранилище до запуска sweep_orphaned_images:
+    удалять их до фиксации транзакции небезопасно.
+    """
+    deleted, _ = product.images.filter(pk__in=image_ids).delete()
+    if deleted:
+        images_changed(product)
+    return deleted
+
+
+@transaction.atomic
+def reorder_product_images(product, image_ids):
+    """
+    Новый порядок галереи: перечисленные изображения идут первыми в
+    заданном порядке, остальные - следом, сохраняя прежний порядок
+    """
+    positions = {image_id: index for index, image_id in enumerate(image_ids)}
+    images = sorted(
+        product.images.select_for_update().order_by("order", "pk"),
+        key=lambda image: positions.get(image.pk, len(positions)),
+    )
+    changed = []
+    for order, image in enumerate(images):
+        if image.order != order:
+            image.order = order
+            changed.append(image)
+    if changed:
+        ProductImage.objects.bulk_update(changed, ["order"])
+        images_changed(product)
+    return images
+
+
+def sweep_orphaned_images(min_age=timedelta(hours=1), root="product_images"):
+    """
+    Удаление файлов изображений, на которые не ссылается ни одна запись.
+
+    Свежие файлы пропускаются: загрузка сохраняет файл раньше, чем
+    фиксируется транзакция со ссылкой на него. Возвращает число
+    удаленных файлов.
+    """
+    referenced = set()
+    for names in ProductImage.objects.values_list(
+        "image", "thumbnail", "webp"
+    ).iterator():
+        referenced.update(name for name in names if name)
+
+    if not default_storage.exists(root):
+        return 0
+
+    threshold = timezone.now() - min_age
+    removed = 0
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        subdirectories, files = default_storage.listdir(directory)
+        directories.extend(posixpath.join(directory, name) for name in subdirectories)
+        for name in files:
+            path = posixpath.join(directory, name)
+            if path in referenced:
+                continue
+            if default_storage.get_modified_time(path) > threshold:
+                continue
+            default_storage.delete(path)
+            removed += 1
+    return removed
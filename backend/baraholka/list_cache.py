@@ -0,0 +1,84 @@
+import hashlib
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+ALL_PRODUCTS_SCOPE = "all"
+
+
+class ProductListCache:
+    """
+    Кэш ответов списка товаров для анонимных пользователей.
+
+    Ключ строится из нормализованной строки запроса и версий областей,
+    от которых зависит выборка: категорий из параметров запроса либо
+    всего каталога. Изменение товара меняет версии его категорий
+    (со всеми предками) и каталога, остальные записи остаются в кэше.
+    """
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "PRODUCT_LIST_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "PRODUCT_LIST_CACHE_TIMEOUT", 60)
+
+    def version_key(self, scope):
+        return f"product_list_version:{scope}"
+
+    def get_scopes(self, request):
+        scopes = [
+            request.query_params.get(param)
+            for param in ("category", "subcategory")
+            if request.query_params.get(param)
+        ]
+        return scopes or [ALL_PRODUCTS_SCOPE]
+
+    def get_versions(self, scopes):
+        keys = [self.version_key(scope) for scope in scopes]
+        versions = self.cache.get_many(keys)
+        missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+        if missing:
+            for key, version in missing.items():
+                self.cache.add(key, version, None)
+            versions.update(self.cache.get_many(list(missing)))
+        return [versions.get(key, "") for key in keys]
+
+    def make_key(self, request):
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        )
+        scopes = self.get_scopes(request)
+        raw_key = "|".join(
+            [
+                # Ссылки на изображения абсолютные и зависят от адреса запроса
+                request.build_absolute_uri("/"),
+                urlencode(params),
+                *self.get_versions(scopes),
+            ]
+        )
+        return "product_list:" + hashlib.md5(raw_key.encode()).hexdigest()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        self.cache.set(key, data, self.timeout)
+
+    def invalidate(self, *category_paths):
+        """Сброс выборок каталога и категорий из переданных путей"""
+        scopes = {ALL_PRODUCTS_SCOPE}
+        for path in category_paths:
+            scopes.update(part for part in (path or "").split("/") if part)
+        self.cache.set_many(
+            {self.version_key(scope): uuid.uuid4().hex for scope in scopes}, None
+        )
+
+
+product_list_cache = ProductListCache()
@@ -0,0 +1,109 @@
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from baraholka.benchmark import BenchmarkRunner, compare
+from baraholka.models import Product
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+
+
+class Command(BaseCommand):
+    help = "Измеряет задержки ключевых сценариев API и сравнивает их с эталоном"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios", nargs="*", help="Сценарии для прогона; по умолчанию все"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--warmup", type=int, default=20, help="Запросы без учета в отчете"
+        )
+        parser.add_argument(
+            "--url",
+            help="Адрес запущенного сервера, например http://127.0.0.1:8000; "
+            "без него запросы выполняются в процессе",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Число параллельных клиентов (только вместе с --url)",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Сохранить результаты как новый эталон",
+        )
+        parser.add_argument(
+            "--max-regression",
+            type=float,
+            default=20,
+            help="Допустимый рост p95 в процентах",
+        )
+
+    def handle(self, *args, **options):
+        runner = BenchmarkRunner(
+            requests=options["requests"],
+            warmup=options["warmup"],
+            concurrency=options["concurrency"],
+            base_url=options["url"],
+            host=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost",
+            seed=options["seed"],
+        )
+        unknown = set(options["scenarios"]) - set(runner.scenarios())
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+        try:
+            results = runner.run(options["scenarios"])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+
+        baseline_path = Path(options["baseline"])
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline = {"meta": self.get_meta(options), "results": results}
+            baseline_path.write_text(
+                json.dumps(baseline, ensure_ascii=False, indent=2) + "\n",
+                encoding="utf-8",
+            )
+            self.stdout.write(self.style.SUCCESS(f"Эталон сохранен: {baseline_path}"))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write("Эталона нет; сохраните его с --save-baseline")
+            return
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+        lines, regressed = compare(
+            results, baseline["results"], options["max_regression"]
+        )
+        for line in lines:
+            self.stdout.write(line)
+        if regressed:
+            raise CommandError("Производительность хуже эталона")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет"))
+
+    def get_meta(self, options):
+        return {
+            "created_at": timezone.now().isoformat(timespec="seconds"),
+            "database": (
+                f"{connection.vendor} {connection.pg_version}"
+                if connection.vendor == "postgresql"
+                else connection.vendor
+            ),
+            "python": platform.python_version(),
+            "products": Product.objects.count(),
+            "requests": options["requests"],
+            "concurrency": options["concurrency"] if options["url"] else 1,
+            "mode": "http" if options["url"] else "in-process",
+        }
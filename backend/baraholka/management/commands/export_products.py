@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from baraholka.bulk import FORMATS, export_products
+from baraholka.models import Product
+
+
+class Command(BaseCommand):
+    help = "Выгружает товары в JSONL или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="Путь к файлу; по умолчанию stdout")
+        parser.add_argument("--file-format", choices=FORMATS, default="jsonl")
+        parser.add_argument("--seller", help="Только товары этого пользователя")
+        parser.add_argument("--status", help="Только товары с этим статусом")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options["seller"]:
+            queryset = queryset.filter(seller__username=options["seller"])
+        if options["status"]:
+            queryset = queryset.filter(status=options["status"])
+
+        lines = export_products(queryset, options["file_format"])
+        if not options["path"]:
+            sys.stdout.writelines(lines)
+            return
+        with open(options["path"], "w", encoding="utf-8", newline="") as stream:
+            stream.writelines(lines)
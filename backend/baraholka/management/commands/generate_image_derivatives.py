@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from baraholka.images import image_derivatives
+from baraholka.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = "Создает миниатюры и WebP-копии изображений товаров, у которых их нет"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать производные для всех изображений",
+        )
+
+    def handle(self, *args, **options):
+        images = ProductImage.objects.order_by("pk")
+        if not options["all"]:
+            images = images.filter(thumbnail="")
+
+        processed = failed = 0
+        for image_id in list(images.values_list("pk", flat=True)):
+            try:
+                if image_derivatives.generate(image_id):
+                    processed += 1
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f"Изображение {image_id}: {error}")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано изображений: {processed}, с ошибкой: {failed}"
+            )
+        )
@@ -0,0 +1,48 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from baraholka.bulk import FORMATS, IMPORT_BATCH_SIZE, ProductImporter, guess_format
+
+
+class Command(BaseCommand):
+    help = "Импортирует товары продавца из файла JSONL или CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу импорта")
+        parser.add_argument("--seller", required=True, help="Имя пользователя-продавца")
+        parser.add_argument(
+            "--file-format",
+            choices=FORMATS,
+            help="Формат файла; по умолчанию определяется по расширению",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help="Сколько строк вставлять одним запросом",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options["seller"])
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['seller']} не найден")
+
+        file_format = options["file_format"] or guess_format(options["path"])
+        importer = ProductImporter(seller, batch_size=options["batch_size"])
+        with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+            report = importer.run(stream, file_format)
+
+        for error in report["errors"]:
+            self.stderr.write(
+                f"Строка {error['line']}: "
+                f"{json.dumps(error['errors'], ensure_ascii=False)}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано товаров: {report['created']}, "
+                f"строк с ошибками: {report['error_count']}"
+            )
+        )
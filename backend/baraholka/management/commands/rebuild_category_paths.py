@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from baraholka.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает материализованные пути категорий и товаров"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        categories = list(Category.objects.all())
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+
+        # Обход от корней, чтобы путь родителя был известен раньше потомков
+        stack = [(category, "/") for category in children.get(None, [])]
+        paths = {}
+        while stack:
+            category, parent_path = stack.pop()
+            paths[category.pk] = f"{parent_path}{category.pk}/"
+            stack.extend(
+                (child, paths[category.pk]) for child in children.get(category.pk, [])
+            )
+
+        for category in categories:
+            category.path = paths.get(category.pk, "")
+        Category.objects.bulk_update(categories, ["path"], batch_size=500)
+
+        for category_id, path in paths.items():
+            Product.objects.filter(
+                Q(subcategory_id=category_id)
+                | Q(subcategory__isnull=True, category_id=category_id)
+            ).update(category_path=path)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Пути пересчитаны для {len(paths)} категорий")
+        )
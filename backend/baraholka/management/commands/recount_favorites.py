@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from baraholka.favorites import recount_favorites
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики избранного товаров по таблице избранного"
+
+    def handle(self, *args, **options):
+        updated = recount_favorites()
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано товаров: {updated}"))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from baraholka.stats import prune_product_views, rollup_product_views
+
+
+class Command(BaseCommand):
+    help = (
+        "Сворачивает просмотры товаров в дневную статистику "
+        "и удаляет сырые просмотры старше срока хранения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.PRODUCT_VIEWS_RETENTION_DAYS,
+            help="Сколько дней хранить сырые просмотры",
+        )
+        parser.add_argument(
+            "--no-prune",
+            action="store_true",
+            help="Только свернуть просмотры, ничего не удаляя",
+        )
+
+    def handle(self, *args, **options):
+        rows = rollup_product_views()
+        self.stdout.write(f"Обновлено строк дневной статистики: {rows}")
+
+        if not options["no_prune"]:
+            deleted = prune_product_views(options["retention_days"])
+            self.stdout.write(f"Удалено старых просмотров: {deleted}")
+
+        self.stdout.write(self.style.SUCCESS("Готово"))
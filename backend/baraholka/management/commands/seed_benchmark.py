@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from baraholka.benchmark import BenchmarkSeeder, clear_benchmark_data
+
+
+class Command(BaseCommand):
+    help = "Наполняет базу воспроизводимым набором данных для нагрузочных тестов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--views", type=int, default=1000000)
+        parser.add_argument("--favorites", type=int, default=50000)
+        parser.add_argument("--chats", type=int, default=20000)
+        parser.add_argument("--messages-per-chat", type=int, default=10)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Сколько строк вставлять одним запросом",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=42, help="Начальное значение генератора"
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить ранее созданный набор перед наполнением",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 or options["products"] < 1:
+            raise CommandError("Нужно хотя бы два пользователя и один товар")
+
+        if options["clear"]:
+            deleted, _ = clear_benchmark_data()
+            self.stdout.write(f"Удалено объектов: {deleted}")
+
+        seeder = BenchmarkSeeder(
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        try:
+            seeder.seed(
+                users=options["users"],
+                products=options["products"],
+                views=options["views"],
+                favorites=options["favorites"],
+                chats=options["chats"],
+                messages_per_chat=options["messages_per_chat"],
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS("Набор данных создан"))
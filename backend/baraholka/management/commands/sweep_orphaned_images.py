@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from baraholka.images import sweep_orphaned_images
+
+
+class Command(BaseCommand):
+    help = "Удаляет файлы изображений товаров, на которые не ссылается ни одна запись"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60,
+            help="Не трогать файлы моложе указанного числа минут",
+        )
+
+    def handle(self, *args, **options):
+        removed = sweep_orphaned_images(min_age=timedelta(minutes=options["min_age"]))
+        self.stdout.write(self.style.SUCCESS(f"Удалено файлов: {removed}"))
@@ -0,0 +1,258 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger("baraholka")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def observe(self, values, labels, amount=1):
+        values[labels] = values.get(labels, 0) + amount
+
+    def merge(self, total, value):
+        return (total or 0) + value
+
+    def samples(self, labels, value):
+        yield self.name, labels, value
+
+
+class Histogram(Counter):
+    """Гистограмма: счетчики по корзинам (не накопленные), сумма и количество"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, values, labels, amount):
+        value = values.get(labels)
+        if value is None:
+            value = values[labels] = [0] * (len(self.buckets) + 1) + [0]
+        for index, bound in enumerate(self.buckets):
+            if amount <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        value[index] += 1
+        value[-1] += amount
+
+    def merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [left + right for left, right in zip(total, value)]
+
+    def samples(self, labels, value):
+        cumulative = 0
+        bounds = [format_number(bound) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, value):
+            cumulative += count
+            yield f"{self.name}_bucket", labels + (("le", bound),), cumulative
+        yield f"{self.name}_sum", labels, value[-1]
+        yield f"{self.name}_count", labels, cumulative
+
+
+REQUESTS = Counter(
+    "baraholka_http_requests_total",
+    "Число запросов по представлению, методу и коду ответа",
+    ("view", "method", "status"),
+)
+LATENCY = Histogram(
+    "baraholka_http_request_duration_seconds",
+    "Время обработки запроса",
+    ("view", "method"),
+    LATENCY_BUCKETS,
+)
+QUERIES = Histogram(
+    "baraholka_http_request_db_queries",
+    "Число запросов к БД на HTTP-запрос",
+    ("view", "method"),
+    QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    "baraholka_http_request_db_duration_seconds",
+    "Время запросов к БД на HTTP-запрос",
+    ("view", "method"),
+    LATENCY_BUCKETS,
+)
+METRICS = (REQUESTS, LATENCY, QUERIES, DB_TIME)
+
+
+class MetricsRegistry:
+    """
+    Метрики запросов процесса.
+
+    Значения копятся в памяти и раз в METRICS_FLUSH_INTERVAL секунд
+    записываются в файл процесса в METRICS_DIR; /metrics складывает файлы
+    всех рабочих процессов. Без METRICS_DIR отдаются метрики только
+    текущего процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._path = None
+        self._flushed_at = 0.0
+        self._values = {}
+        atexit.register(self.flush)
+
+    @property
+    def directory(self):
+        return getattr(settings, "METRICS_DIR", None)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+
+    def _check_process(self):
+        # После fork дочерний процесс начинает со своим файлом и пустыми
+        # значениями, иначе метрики родителя посчитаются дважды
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._path = None
+            self._values = {metric.name: {} for metric in METRICS}
+
+    def observe_request(self, view, method, status, duration, queries, db_time):
+        labels = (view, method)
+        with self._lock:
+            self._check_process()
+            REQUESTS.observe(self._values[REQUESTS.name], (view, method, str(status)))
+            LATENCY.observe(self._values[LATENCY.name], labels, duration)
+            QUERIES.observe(self._values[QUERIES.name], labels, queries)
+            DB_TIME.observe(self._values[DB_TIME.name], labels, db_time)
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+
+        if due and self.directory:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_process()
+            # Гистограммы копируются, чтобы запись в файл шла без блокировки
+            return {
+                name: [
+                    [list(labels), list(value) if isinstance(value, list) else value]
+                    for labels, value in values.items()
+                ]
+                for name, values in self._values.items()
+            }
+
+    def flush(self):
+        """Атомарная запись значений процесса в его файл"""
+        if not self.directory:
+            return
+        data = self.snapshot()
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if self._path is None:
+                directory = Path(self.directory)
+                directory.mkdir(parents=True, exist_ok=True)
+                # Случайная часть имени не дает новому процессу с тем же pid
+                # перезаписать накопленные значения завершившегося
+                self._path = directory / f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+            path = self._path
+
+        temporary = path.with_suffix(".tmp")
+        try:
+            temporary.write_text(json.dumps(data))
+            os.replace(temporary, path)
+        except OSError:
+            logger.exception("Ошибка записи метрик в %s", path)
+
+    def collect(self):
+        """Значения, сложенные по всем процессам"""
+        if not self.directory:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            for path in Path(self.directory).glob("*.json"):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    # Файл процесса мог быть удален во время чтения
+                    continue
+
+        merged = {metric.name: {} for metric in METRICS}
+        for snapshot in snapshots:
+            for metric in METRICS:
+                values = merged[metric.name]
+                for labels, value in snapshot.get(metric.name, []):
+                    labels = tuple(labels)
+                    values[labels] = metric.merge(values.get(labels), value)
+        return merged
+
+    def render(self):
+        """Текстовый формат Prometheus"""
+        merged = self.collect()
+        lines = []
+        for metric in METRICS:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in sorted(merged[metric.name].items()):
+                pairs = tuple(zip(metric.labelnames, labels))
+                for name, sample_labels, sample in metric.samples(pairs, value):
+                    lines.append(
+                        f"{name}{format_labels(sample_labels)} {format_number(sample)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def format_number(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def format_labels(labels):
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def view_label(view_func, method):
+    """
+    Метка представления: для DRF - класс и действие
+    (ProductViewSet.retrieve, MessageViewSet.mark_as_read), иначе имя функции
+    """
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return f"{view_class.__name__}.{actions.get(method.lower(), method.lower())}"
+    return f"{view_class.__name__}.{method.lower()}"
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    if request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
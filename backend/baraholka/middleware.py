@@ -0,0 +1,177 @@
+import json
+import logging
+import re
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry, view_label
+
+
+logger = logging.getLogger("baraholka.slow_requests")
+
+# Сколько самых дорогих запросов попадает в запись о медленном запросе
+SLOW_REQUEST_TOP_QUERIES = 5
+
+# Прочие методы сводятся в одну метку, чтобы не плодить ряды метрик
+METRICS_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)")
+WHITESPACE_RE = re.compile(r"\s+")
+
+_current = ContextVar("request_timings", default=None)
+
+
+def fingerprint(sql):
+    """
+    Отпечаток SQL: запросы отличаются только параметрами, поэтому
+    достаточно свернуть списки IN (%s, ...) разной длины и пробелы
+    """
+    return WHITESPACE_RE.sub(" ", IN_LIST_RE.sub("IN (...)", sql)).strip()
+
+
+class RequestTimings:
+    """Время и число запросов к БД, время сериализации одного HTTP-запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        # Текст SQL -> [число выполнений, суммарное время]; отпечатки
+        # считаются только для медленных запросов
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            statement = self.statements.get(sql)
+            if statement is None:
+                self.statements[sql] = [1, duration]
+            else:
+                statement[0] += 1
+                statement[1] += duration
+
+    def top_queries(self, limit=SLOW_REQUEST_TOP_QUERIES):
+        grouped = {}
+        for sql, (count, duration) in self.statements.items():
+            entry = grouped.setdefault(fingerprint(sql), [0, 0.0])
+            entry[0] += count
+            entry[1] += duration
+        ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"sql": sql, "count": count, "ms": round(duration * 1000, 2)}
+            for sql, (count, duration) in ranked[:limit]
+        ]
+
+
+class TimedSerializerMixin:
+    """
+    Учет времени сериализации в RequestTimings.
+
+    Считается только внешний вызов to_representation: вложенные
+    сериализаторы и строки списка внутри него повторно не учитываются.
+    """
+
+    def to_representation(self, instance):
+        timings = _current.get()
+        if timings is None or timings.serializer_depth:
+            return super().to_representation(instance)
+
+        timings.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.serializer_time += time.perf_counter() - started
+            timings.serializer_depth -= 1
+
+
+class RequestTimingMiddleware:
+    """
+    Заголовок Server-Timing, журнал медленных запросов и метрики.
+
+    Запросы к БД считаются через connection.execute_wrapper, время
+    сериализации - через TimedSerializerMixin, время представления - от
+    process_view до ответа. Запросы дольше SLOW_REQUEST_THRESHOLD_MS или
+    с числом запросов к БД больше SLOW_REQUEST_QUERIES пишутся в журнал
+    baraholka.slow_requests вместе с самыми дорогими отпечатками SQL.
+    Те же замеры попадают в метрики /metrics с меткой представления.
+    Middleware стоит первым в списке, чтобы общее время включало остальные.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold_ms = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 1000)
+        self.max_queries = getattr(settings, "SLOW_REQUEST_QUERIES", 30)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        request._view_started = None
+        request._metrics_view = "unmatched"
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finished = time.perf_counter()
+
+        total_ms = (finished - started) * 1000
+        view_ms = None
+        if request._view_started is not None:
+            view_ms = (finished - request._view_started) * 1000
+
+        response["Server-Timing"] = self.server_timing(timings, view_ms, total_ms)
+        if total_ms >= self.threshold_ms or timings.queries > self.max_queries:
+            self.log_slow_request(request, response, timings, view_ms, total_ms)
+
+        method = request.method if request.method in METRICS_METHODS else "other"
+        registry.observe_request(
+            request._metrics_view,
+            method,
+            response.status_code,
+            total_ms / 1000,
+            timings.queries,
+            timings.db_time,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = time.perf_counter()
+        request._metrics_view = view_label(view_func, request.method)
+
+    def server_timing(self, timings, view_ms, total_ms):
+        metrics = [
+            f'db;dur={timings.db_time * 1000:.1f};desc="{timings.queries} queries"',
+            f"serializer;dur={timings.serializer_time * 1000:.1f}",
+        ]
+        if view_ms is not None:
+            metrics.append(f"view;dur={view_ms:.1f}")
+        metrics.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def log_slow_request(self, request, response, timings, view_ms, total_ms):
+        match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "user": getattr(getattr(request, "user", None), "pk", None),
+            "total_ms": round(total_ms, 1),
+            "view_ms": round(view_ms, 1) if view_ms is not None else None,
+            "db_ms": round(timings.db_time * 1000, 1),
+            "serializer_ms": round(timings.serializer_time * 1000, 1),
+            "queries": timings.queries,
+            "top_queries": timings.top_queries(),
+        }
+        logger.warning("Медленный запрос %s", json.dumps(record, ensure_ascii=False))
@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Concat, Substr, Upper
 from django.utils import timezone
 
 
@@ -48,11 +51,27 @@ class Category(models.Model):
     icon = models.ImageField(
         upload_to="category_icons/", verbose_name="Иконка категории", blank=True
     )
+    # Материализованный путь от корня: "/1/5/". Все потомки категории -
+    # это одно индексируемое условие path LIKE '/1/%'
+    path = models.CharField(
+        max_length=255,
+        editable=False,
+        blank=True,
+        db_index=True,
+        verbose_name="Путь в дереве категорий",
+    )
 
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
         ordering = ["name"]
+        indexes = [
+            # Триграммный индекс для подсказок поиска (name__icontains)
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="category_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -60,7 +79,38 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_path()
+
+    def build_path(self):
+        parent_path = self.parent.path if self.parent_id else "/"
+        return f"{parent_path}{self.pk}/"
+
+    def update_path(self):
+        """Пересчет пути категории, ее потомков и их товаров"""
+        old_path, new_path = self.path, self.build_path()
+        if old_path == new_path:
+            return
+
+        self.path = new_path
+        Category.objects.filter(pk=self.pk).update(path=new_path)
+        if not old_path:
+            return
+
+        # Категорию перенесли: заменяем префикс пути у всего поддерева
+        moved_path = Concat(
+            models.Value(new_path), Substr("path", len(old_path) + 1)
+        )
+        Category.objects.filter(path__startswith=old_path).exclude(
+            pk=self.pk
+        ).update(path=moved_path)
+        Product.objects.filter(category_path__startswith=old_path).update(
+            category_path=Concat(
+                models.Value(new_path), Substr("category_path", len(old_path) + 1)
+            )
+        )
 
 
 class Product(models.Model):
@@ -117,14 +167,75 @@ class Product(models.Model):
     views_count = models.PositiveIntegerField(
         default=0, verbose_name="Количество просмотров"
     )
+    # Денормализованный счетчик, чтобы сортировать без агрегации по Favorite
+    favorites_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество добавлений в избранное"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата публикации")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
     slug = models.SlugField(unique=True, verbose_name="URL-идентификатор")
+    # Путь самой глубокой категории товара (подкатегории, если она указана)
+    category_path = models.CharField(
+        max_length=255,
+        editable=False,
+        blank=True,
+        db_index=True,
+        verbose_name="Путь категории",
+    )
+    # Поддерживается самой БД: название весомее описания, русская морфология
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="russian")
+        + SearchVector("description", weight="B", config="russian"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+        verbose_name="Поисковый вектор",
+    )
 
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
         ordering = ["-created_at"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            # Триграммный индекс по активным товарам для подсказок поиска
+            GinIndex(
+                OpClass(Upper("title"), name="gin_trgm_ops"),
+                condition=models.Q(status="active"),
+                name="product_active_title_trgm_idx",
+            ),
+            # Каталог показывает только активные товары, поэтому индексы
+            # под сортировки выдачи частичные; id в конце совпадает с
+            # ключом курсорной пагинации (поле сортировки, id)
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(status="active"),
+                name="product_active_created_idx",
+            ),
+            models.Index(
+                fields=["price", "id"],
+                condition=models.Q(status="active"),
+                name="product_active_price_idx",
+            ),
+            models.Index(
+                fields=["-views_count", "-id"],
+                condition=models.Q(status="active"),
+                name="product_active_views_idx",
+            ),
+            models.Index(
+                fields=["-favorites_count", "-id"],
+                condition=models.Q(status="active"),
+                name="product_active_favorites_idx",
+            ),
+            # Фильтр по категории - префикс пути (LIKE '/1/5/%'), для него
+            # нужен класс операторов varchar_pattern_ops. В большой категории
+            # выгоднее обход индекса сортировки, в небольшой - этот индекс
+            models.Index(
+                OpClass("category_path", name="varchar_pattern_ops"),
+                "price",
+                condition=models.Q(status="active"),
+                name="product_active_cat_price_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -132,6 +243,13 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"category", "subcategory"} & set(update_fields):
+            self.category_path = (self.subcategory or self.category).path
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "category_path"}
+
         super().save(*args, **kwargs)
 
 
@@ -140,6 +258,19 @@ class ProductImage(models.Model):
         Product, on_delete=models.CASCADE, related_name="images", verbose_name="Товар"
     )
     image = models.ImageField(upload_to="product_images/", verbose_name="Изображение")
+    # Производные изображения в WebP, создаются в фоне после загрузки
+    thumbnail = models.ImageField(
+        upload_to="product_images/thumbnails/",
+        blank=True,
+        editable=False,
+        verbose_name="Миниатюра",
+    )
+    webp = models.ImageField(
+        upload_to="product_images/webp/",
+        blank=True,
+        editable=False,
+        verbose_name="Сжатое изображение",
+    )
     order = models.PositiveSmallIntegerField(
         default=0, verbose_name="Порядок отображения"
     )
@@ -213,6 +344,16 @@ class Message(models.Model):
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
         ordering = ["created_at"]
+        indexes = [
+            # Последнее сообщение чата и порции по id для ETag и подгрузки
+            models.Index(fields=["chat", "id"]),
+            # Непрочитанные сообщения чата (их всегда немного)
+            models.Index(
+                fields=["chat"],
+                condition=models.Q(is_read=False),
+                name="baraholka_message_unread_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Сообщение от {self.sender.username} в чате {self.chat.id}"
@@ -233,7 +374,10 @@ class ProductView(models.Model):
     ip_address = models.GenericIPAddressField(
         verbose_name="IP адрес", null=True, blank=True
     )
-    viewed_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата просмотра")
+    # Не auto_now_add: просмотры пишутся пачками с временем учета
+    viewed_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name="Дата просмотра"
+    )
 
     class Meta:
         verbose_name = "Просмотр товара"
@@ -267,3 +411,38 @@ class ProductView(models.Model):
 
         if not existing_view:
             super().save(*args, **kwargs)
+
+
+class ProductDailyStats(models.Model):
+    """
+    Агрегированная статистика товара за день.
+
+    Просмотры заполняет rollup_product_views, избранное и чаты
+    увеличиваются сразу при соответствующих действиях.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        verbose_name="Товар",
+    )
+    date = models.DateField(verbose_name="Дата")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    unique_users = models.PositiveIntegerField(
+        default=0, verbose_name="Уникальные пользователи"
+    )
+    unique_ips = models.PositiveIntegerField(default=0, verbose_name="Уникальные IP")
+    favorites_added = models.PositiveIntegerField(
+        default=0, verbose_name="Добавлений в избранное"
+    )
+    chats_opened = models.PositiveIntegerField(default=0, verbose_name="Новых чатов")
+
+    class Meta:
+        verbose_name = "Статистика товара за день"
+        verbose_name_plural = "Статистика товаров по дням"
+        ordering = ["-date"]
+        unique_together = ["product", "date"]
+
+    def __str__(self):
+        return f"Статистика {self.product.title} за {self.date}"
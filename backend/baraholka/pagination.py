@@ -0,0 +1,162 @@
+import json
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+Cursor = namedtuple("Cursor", ["ordering", "value", "id", "reverse"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по ключу (значение поля сортировки, id).
+
+    В отличие от PageNumberPagination не использует OFFSET и не считает
+    COUNT(*), поэтому стоимость страницы не зависит от ее глубины.
+    Общее количество отдается только по запросу: count=exact или
+    count=estimate (оценка планировщика).
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering_fields = ("created_at", "price", "views_count", "favorites_count")
+    default_ordering = "-created_at"
+    invalid_cursor_message = "Неверный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.field = self.ordering.lstrip("-")
+        self.count = self.get_count(queryset)
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = cursor is not None and cursor.reverse
+
+        # При движении назад выбираем записи в обратном порядке,
+        # а затем переворачиваем страницу
+        descending = self.ordering.startswith("-") != reverse
+        prefix = "-" if descending else ""
+        queryset = queryset.order_by(prefix + self.field, prefix + "id")
+
+        if cursor is not None:
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": cursor.value})
+                | Q(**{self.field: cursor.value, f"id__{lookup}": cursor.id})
+            )
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        response = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+        if self.count is not None:
+            response = {"count": self.count, **response}
+        return Response(response)
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size and page_size.isdigit() and int(page_size) > 0:
+            return min(int(page_size), self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        """Первое поле сортировки из OrderingFilter представления"""
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering and ordering[0].lstrip("-") in self.ordering_fields:
+                    return ordering[0]
+        return self.default_ordering
+
+    def get_count(self, queryset):
+        mode = self.request.query_params.get(self.count_query_param)
+        if mode == "exact":
+            return queryset.count()
+        if mode == "estimate":
+            # Оценка планировщика не требует сканирования таблицы
+            try:
+                plan = json.loads(queryset.order_by().explain(format="json"))
+                return int(plan[0]["Plan"]["Plan Rows"])
+            except (ValueError, KeyError, IndexError, TypeError):
+                return None
+        return None
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode("ascii")).decode("ascii")
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            ordering = tokens["o"][0]
+            value = model._meta.get_field(ordering.lstrip("-")).to_python(
+                tokens["v"][0]
+            )
+            cursor_id = int(tokens["i"][0])
+            reverse = tokens.get("r", ["0"])[0] == "1"
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        # Курсор действителен только для той сортировки, в которой он получен
+        if ordering != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(ordering=ordering, value=value, id=cursor_id, reverse=reverse)
+
+    def encode_cursor(self, obj, reverse=False):
+        value = getattr(obj, self.field)
+        tokens = {
+            "o": self.ordering,
+            "v": value.isoformat() if hasattr(value, "isoformat") else str(value),
+            "i": obj.pk,
+        }
+        if reverse:
+            tokens["r"] = "1"
+
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode("ascii")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
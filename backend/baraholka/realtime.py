@@ -0,0 +1,181 @@
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.authentication import CachedJWTAuthentication
+from .models import Chat
+
+
+CHAT_SOCKET_PATH = re.compile(r"^/ws/chats/(?P<chat_id>\d+)/$")
+
+# Коды закрытия WebSocket, которые отличает клиент
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+
+
+class BaseBroker:
+    """Слой рассылки событий подписчикам каналов"""
+
+    def subscribe(self, channel):
+        """Подписка на канал, возвращает asyncio.Queue с событиями"""
+        raise NotImplementedError
+
+    def unsubscribe(self, channel, queue):
+        raise NotImplementedError
+
+    def publish(self, channel, event):
+        """Публикация события; может вызываться из синхронного кода"""
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """
+    Рассылка внутри одного процесса.
+
+    Подходит для одного узла и тестов; при нескольких процессах нужен
+    брокер, разделяемый между ними.
+    """
+
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            subscribers.difference_update(
+                [subscriber for subscriber in subscribers if subscriber[1] is queue]
+            )
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент догонит пропущенное через after_id
+            pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(
+                    settings, "REALTIME_BROKER", "baraholka.realtime.InMemoryBroker"
+                )
+                _broker = import_string(broker_path)()
+    return _broker
+
+
+def chat_channel(chat_id):
+    return f"chat:{chat_id}"
+
+
+def publish_chat_event(chat_id, event):
+    """Рассылка события участникам чата после фиксации транзакции"""
+    transaction.on_commit(
+        lambda: get_broker().publish(chat_channel(chat_id), event)
+    )
+
+
+def get_socket_user_id(scope):
+    """
+    id пользователя из access-токена в строке запроса (?token=...).
+
+    Токен проверяется так же, как в API: отозванные при выходе токены и
+    неактивные пользователи не допускаются.
+    """
+    query = parse_qs(scope.get("query_string", b"").decode())
+    token = query.get("token", [None])[0]
+    if not token:
+        return None
+    try:
+        user = CachedJWTAuthentication().get_user(AccessToken(token))
+    except (TokenError, AuthenticationFailed):
+        return None
+    return user.pk
+
+
+async def chat_socket(scope, receive, send):
+    """ASGI-обработчик WebSocket /ws/chats/<id>/ с событиями чата"""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    match = CHAT_SOCKET_PATH.match(scope["path"])
+    if not match:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    chat_id = int(match.group("chat_id"))
+    user_id = await sync_to_async(get_socket_user_id)(scope)
+    if (
+        user_id is None
+        or not await Chat.objects.filter(id=chat_id, participants=user_id).aexists()
+    ):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN})
+        return
+
+    await send({"type": "websocket.accept"})
+
+    broker = get_broker()
+    channel = chat_channel(chat_id)
+    queue = broker.subscribe(channel)
+    receive_task = asyncio.ensure_future(receive())
+    event_task = asyncio.ensure_future(queue.get())
+    try:
+        # Пока событий нет, соединение только ждет и не нагружает сервер
+        while True:
+            done, _ = await asyncio.wait(
+                {receive_task, event_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if event_task in done:
+                await send(
+                    {
+                        "type": "websocket.send",
+                        "text": json.dumps(event_task.result(), ensure_ascii=False),
+                    }
+                )
+                event_task = asyncio.ensure_future(queue.get())
+            if receive_task in done:
+                if receive_task.result()["type"] == "websocket.disconnect":
+                    break
+                # Входящие сообщения клиента игнорируются
+                receive_task = asyncio.ensure_future(receive())
+    finally:
+        receive_task.cancel()
+        event_task.cancel()
+        broker.unsubscribe(channel, queue)
@@ -9,6 +9,9 @@ from .models import (
     Message,
     Chat,
 )
+from .favorites import get_favorite_ids
+from .images import add_product_images
+from .middleware import TimedSerializerMixin
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -26,7 +29,7 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer()
     created_at = serializers.DateTimeField(format="%d.%m.%Y", read_only=True)
 
@@ -78,7 +81,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return instance
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ("id", "name", "description", "parent", "slug", "icon")
@@ -88,15 +91,31 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ("id", "image", "order")
-        read_only_fields = ("id",)
+        fields = ("id", "image", "thumbnail", "webp", "order")
+        read_only_fields = ("id", "thumbnail", "webp")
+
+
+class FavoriteStateMixin:
+    """
+    Признак is_favorite по множеству id избранного пользователя: множество
+    берется один раз на ответ и хранится в общем контексте сериализаторов
+    """
+
+    def get_is_favorite(self, obj):
+        if "favorite_ids" not in self.context:
+            request = self.context.get("request")
+            self.context["favorite_ids"] = get_favorite_ids(request and request.user)
+        return obj.pk in self.context["favorite_ids"]
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(
+    TimedSerializerMixin, FavoriteStateMixin, serializers.ModelSerializer
+):
     category_name = serializers.CharField(source="category.name", read_only=True)
     subcategory_name = serializers.CharField(source="subcategory.name", read_only=True)
     seller_name = serializers.CharField(source="seller.username", read_only=True)
     main_image = serializers.SerializerMethodField()
+    is_favorite = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -111,20 +130,34 @@ class ProductListSerializer(serializers.ModelSerializer):
             "status",
             "location",
             "views_count",
+            "favorites_count",
             "created_at",
             "slug",
             "main_image",
+            "is_favorite",
+        )
+        read_only_fields = (
+            "id",
+            "views_count",
+            "favorites_count",
+            "created_at",
+            "slug",
         )
-        read_only_fields = ("id", "views_count", "created_at", "slug")
 
     def get_main_image(self, obj):
-        first_image = obj.images.first()
+        # Изображения предзагружаются представлениями через prefetch_related,
+        # поэтому здесь нет отдельного запроса на каждую строку
+        first_image = next(iter(obj.images.all()), None)
         if first_image:
-            return self.context["request"].build_absolute_uri(first_image.image.url)
+            # В карточках достаточно миниатюры, оригинал - пока ее нет
+            image = first_image.thumbnail or first_image.image
+            return self.context["request"].build_absolute_uri(image.url)
         return None
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(
+    TimedSerializerMixin, FavoriteStateMixin, serializers.ModelSerializer
+):
     category = CategorySerializer(read_only=True)
     subcategory = CategorySerializer(read_only=True)
     seller = UserSerializer(read_only=True)
@@ -145,22 +178,24 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             "status",
             "location",
             "views_count",
+            "favorites_count",
             "created_at",
             "updated_at",
             "slug",
             "images",
             "is_favorite",
         )
-        read_only_fields = ("id", "views_count", "created_at", "updated_at", "slug")
-
-    def get_is_favorite(self, obj):
-        request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            return Favorite.objects.filter(user=request.user, product=obj).exists()
-        return False
+        read_only_fields = (
+            "id",
+            "views_count",
+            "favorites_count",
+            "created_at",
+            "updated_at",
+            "slug",
+        )
 
 
-class ProductCreateUpdateSerializer(serializers.ModelSerializer):
+class ProductCreateUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
         child=serializers.ImageField(
@@ -191,7 +226,12 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         category = data.get("category")
         subcategory = data.get("subcategory")
 
-        if subcategory and subcategory.parent != category:
+        # Подкатегория может быть на любом уровне под выбранной категорией
+        if subcategory and (
+            category is None
+            or subcategory == category
+            or not subcategory.path.startswith(category.path)
+        ):
             raise serializers.ValidationError(
                 {
                     "subcategory": [
@@ -206,8 +246,8 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
         uploaded_images = validated_data.pop("uploaded_images", [])
         product = Product.objects.create(**validated_data)
 
-        for order, image in enumerate(uploaded_images):
-            ProductImage.objects.create(product=product, image=image, order=order)
+        if uploaded_images:
+            add_product_images(product, uploaded_images)
 
         return product
 
@@ -218,15 +258,39 @@ class ProductCreateUpdateSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
+        # Новые изображения добавляются к галерее; удаление и порядок -
+        # через отдельные действия ProductViewSet
         if uploaded_images:
-            instance.images.all().delete()
-            for order, image in enumerate(uploaded_images):
-                ProductImage.objects.create(product=instance, image=image, order=order)
+            add_product_images(instance, uploaded_images)
 
         return instance
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class ProductImageUploadSerializer(serializers.Serializer):
+    images = serializers.ListField(
+        child=serializers.ImageField(
+            max_length=1000000, allow_empty_file=False, use_url=False
+        ),
+        allow_empty=False,
+    )
+
+
+class ProductImageIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_ids(self, ids):
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Изображения не должны повторяться")
+        product = self.context["product"]
+        unknown = set(ids) - set(product.images.values_list("id", flat=True))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Изображения не принадлежат товару: {sorted(unknown)}"
+            )
+        return ids
+
+
+class FavoriteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
 
     class Meta:
@@ -235,7 +299,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "user", "created_at")
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     sender_username = serializers.CharField(source="sender.username", read_only=True)
     created_at = serializers.DateTimeField(format="%d.%m.%Y %H:%M", read_only=True)
 
@@ -253,7 +317,7 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "chat", "sender", "created_at", "is_read")
 
 
-class ChatSerializer(serializers.ModelSerializer):
+class ChatSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
@@ -272,11 +336,17 @@ class ChatSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "created_at")
 
     def get_last_message(self, obj):
-        last_message = obj.messages.last()
+        # В списке чатов последнее сообщение предзагружено ChatViewSet
+        if hasattr(obj, "latest_messages"):
+            last_message = obj.latest_messages[0] if obj.latest_messages else None
+        else:
+            last_message = obj.messages.last()
         if last_message:
             return MessageSerializer(last_message).data
         return None
 
     def get_unread_count(self, obj):
+        if hasattr(obj, "unread_messages_count"):
+            return obj.unread_messages_count
         user = self.context["request"].user
         return obj.messages.filter(is_read=False).exclude(sender=user).count()
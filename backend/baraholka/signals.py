@@ -0,0 +1,111 @@
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+
+def create_postgres_extensions(sender, using, **kwargs):
+    """Создание расширений PostgreSQL, от которых зависят индексы приложения"""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        # gin_trgm_ops для индексов подсказок поиска
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+def invalidate_category_tree(sender, **kwargs):
+    """Сброс закэшированного дерева категорий при изменении категории"""
+    from .categories import category_tree
+
+    # После фиксации: Category.save досчитывает путь в той же транзакции
+    transaction.on_commit(category_tree.invalidate)
+
+
+def remember_product_category(
+    sender, instance, raw=False, update_fields=None, **kwargs
+):
+    """Прежний путь категории товара, чтобы сбросить и его выборки"""
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not {"category", "subcategory"} & set(
+        update_fields
+    ):
+        return
+    instance._old_category_path = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("category_path", flat=True)
+        .first()
+    )
+
+
+def invalidate_product_lists(sender, instance, **kwargs):
+    """Сброс закэшированных списков товаров при изменении товара"""
+    from .list_cache import product_list_cache
+
+    paths = [instance.category_path, getattr(instance, "_old_category_path", None)]
+    transaction.on_commit(lambda: product_list_cache.invalidate(*paths))
+
+
+def invalidate_product_image_lists(sender, instance, **kwargs):
+    """Сброс закэшированных списков товаров при изменении изображений"""
+    from .list_cache import product_list_cache
+    from .models import Product
+
+    path = (
+        Product.objects.filter(pk=instance.product_id)
+        .values_list("category_path", flat=True)
+        .first()
+    )
+    transaction.on_commit(lambda: product_list_cache.invalidate(path))
+
+
+def touch_product(sender, instance, **kwargs):
+    """Обновление updated_at товара при изменении его изображений"""
+    from .models import Product
+
+    # updated_at входит в ETag товара, поэтому должен меняться вместе с фото
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+def schedule_image_derivatives(
+    sender, instance, created=False, raw=False, update_fields=None, **kwargs
+):
+    """Фоновое создание миниатюры и WebP-копии загруженного изображения"""
+    from .images import image_derivatives
+
+    # Сохранение самих производных идет с update_fields и сюда не попадает
+    if raw or not (created or update_fields is None):
+        return
+    image_derivatives.schedule(instance.pk)
+
+
+def invalidate_favorite_ids(sender, instance, **kwargs):
+    """Сброс закэшированного списка избранного пользователя"""
+    from .favorites import invalidate_favorite_ids
+
+    invalidate_favorite_ids(instance.user_id)
+
+
+def update_favorites_count(sender, instance, created=None, raw=False, **kwargs):
+    """Поддержка Product.favorites_count при изменении избранного через ORM"""
+    from .models import Product
+
+    if raw or created is False:
+        return
+    # post_save передает created=True, post_delete - не передает вовсе
+    delta = 1 if created else -1
+    # Счетчик до пересчета recount_favorites может быть меньше реального
+    Product.objects.filter(pk=instance.product_id).update(
+        favorites_count=Greatest(F("favorites_count") + delta, 0)
+    )
+
+
+def count_added_favorite(sender, instance, created=False, raw=False, **kwargs):
+    """Учет добавления в избранное в дневной статистике товара"""
+    from .stats import increment_daily_stat
+
+    if raw or not created:
+        return
+    increment_daily_stat(instance.product_id, "favorites_added")
@@ -0,0 +1,203 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Count, IntegerField, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Product, ProductDailyStats, ProductView
+
+
+ROLLUP_BATCH_SIZE = 1000
+STATS_FIELDS = (
+    "views",
+    "unique_users",
+    "unique_ips",
+    "favorites_added",
+    "chats_opened",
+)
+
+
+def start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def last_rolled_date():
+    # Строки за сегодня появляются и без просмотров (избранное, чаты),
+    # поэтому свернутым считается последний день с просмотрами
+    stats = ProductDailyStats.objects.filter(views__gt=0)
+    return stats.aggregate(last=Max("date"))["last"]
+
+
+def rollup_product_views(until=None):
+    """
+    Сворачивает сырые просмотры закрытых дней (до until) в ProductDailyStats.
+
+    Повторно пересчитывается только последний свернутый день, поэтому
+    запуск идемпотентен. Возвращает число обновленных строк статистики.
+    """
+    until = until or timezone.localdate()
+    last_date = last_rolled_date()
+
+    views = ProductView.objects.filter(viewed_at__lt=start_of_day(until))
+    if last_date is not None:
+        views = views.filter(viewed_at__gte=start_of_day(last_date))
+
+    rows = (
+        views.annotate(date=TruncDate("viewed_at"))
+        .values("product_id", "date")
+        .annotate(
+            views=Count("id"),
+            unique_users=Count("user", distinct=True),
+            unique_ips=Count("ip_address", distinct=True),
+        )
+        .order_by()
+    )
+
+    total = 0
+    product_ids = set()
+    batch = []
+    for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+        batch.append(ProductDailyStats(**row))
+        product_ids.add(row["product_id"])
+        if len(batch) >= ROLLUP_BATCH_SIZE:
+            total += _save_daily_stats(batch)
+            batch = []
+    if batch:
+        total += _save_daily_stats(batch)
+
+    sync_views_count(product_ids, today=until)
+    return total
+
+
+def _save_daily_stats(batch):
+    ProductDailyStats.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=["product", "date"],
+        update_fields=["views", "unique_users", "unique_ips"],
+    )
+    return len(batch)
+
+
+def sync_views_count(product_ids, today=None):
+    """views_count = сумма дневной статистики + еще не свернутые просмотры"""
+    today = today or timezone.localdate()
+    rolled_up = (
+        ProductDailyStats.objects.filter(product=OuterRef("pk"), date__lt=today)
+        .values("product")
+        .annotate(total=Sum("views"))
+        .values("total")
+    )
+    fresh = (
+        ProductView.objects.filter(
+            product=OuterRef("pk"), viewed_at__gte=start_of_day(today)
+        )
+        .values("product")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+    product_ids = sorted(product_ids)
+    for i in range(0, len(product_ids), ROLLUP_BATCH_SIZE):
+        Product.objects.filter(pk__in=product_ids[i : i + ROLLUP_BATCH_SIZE]).update(
+            views_count=Coalesce(Subquery(rolled_up), 0, output_field=IntegerField())
+            + Coalesce(Subquery(fresh), 0, output_field=IntegerField())
+        )
+
+
+def prune_product_views(retention_days, batch_size=10000):
+    """Удаляет сырые просмотры старше срока хранения пачками"""
+    cutoff = start_of_day(timezone.localdate() - timedelta(days=retention_days))
+    # Не удаляем то, что еще не попало в дневную статистику
+    last_date = last_rolled_date()
+    if last_date is None:
+        return 0
+    cutoff = min(cutoff, start_of_day(last_date))
+
+    deleted = 0
+    while True:
+        ids = list(
+            ProductView.objects.filter(viewed_at__lt=cutoff).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += ProductView.objects.filter(id__in=ids).delete()[0]
+
+
+def increment_daily_stat(product_id, field, amount=1):
+    """Атомарное увеличение счетчика сегодняшней статистики товара"""
+    today = timezone.localdate()
+    stats = ProductDailyStats.objects.filter(product_id=product_id, date=today)
+    if stats.update(**{field: F(field) + amount}):
+        return
+
+    try:
+        with transaction.atomic():
+            ProductDailyStats.objects.create(
+                product_id=product_id, date=today, **{field: amount}
+            )
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        stats.update(**{field: F(field) + amount})
+
+
+def get_daily_stats(products, days):
+    """
+    Статистика товаров по дням за последние days дней, включая сегодня.
+
+    Сегодняшние просмотры еще не свернуты и берутся из ProductView.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+
+    rows = (
+        ProductDailyStats.objects.filter(product__in=products, date__gte=start)
+        .values("date")
+        .annotate(**{field: Sum(field) for field in STATS_FIELDS})
+        .order_by()
+    )
+    by_date = {row["date"]: row for row in rows}
+
+    today_views = ProductView.objects.filter(
+        product__in=products, viewed_at__gte=start_of_day(today)
+    ).aggregate(
+        views=Count("id"),
+        unique_users=Count("user", distinct=True),
+        unique_ips=Count("ip_address", distinct=True),
+    )
+    by_date.setdefault(today, {}).update(today_views)
+
+    daily = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        row = by_date.get(date, {})
+        daily.append(
+            {
+                "date": date.isoformat(),
+                **{field: row.get(field) or 0 for field in STATS_FIELDS},
+            }
+        )
+
+    totals = {
+        field: sum(day[field] for day in daily)
+        for field in ("views", "favorites_added", "chats_opened")
+    }
+    return {"days": days, "totals": totals, "daily": daily}
+
+
+def get_top_products(products, days, limit=10):
+    """Товары с наибольшим числом просмотров за свернутые дни периода"""
+    start = timezone.localdate() - timedelta(days=days - 1)
+    return list(
+        ProductDailyStats.objects.filter(product__in=products, date__gte=start)
+        .values("product_id", slug=F("product__slug"), title=F("product__title"))
+        .annotate(
+            views=Sum("views"),
+            favorites_added=Sum("favorites_added"),
+            chats_opened=Sum("chats_opened"),
+        )
+        .order_by("-views", "product_id")[:limit]
+    )
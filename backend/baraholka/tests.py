@@ -1 +1,456 @@
-from django.test import TestCase
+import json
+from base64 import b64decode, b64encode
+from decimal import Decimal
+from urllib.parse import parse_qs, urlsplit
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .favorites import toggle_favorite
+from .models import Category, Favorite, Product, ProductView
+from .view_counter import FLUSH_ATTEMPTS, ProductViewBuffer
+
+
+@skipUnless(connection.vendor == "postgresql", "Проверяются планы PostgreSQL")
+class ProductListIndexTests(TestCase):
+    """
+    Планировщик выбирает индексы выдачи каталога.
+
+    База наполняется товарами так, чтобы полный просмотр таблицы был
+    заметно дороже, а после ANALYZE проверяется план запроса страницы,
+    который строит ProductViewSet.
+    """
+
+    PRODUCTS = 20000
+    CATEGORIES = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller")
+        cls.categories = [
+            Category.objects.create(name=f"Категория {number}", slug=f"c{number}")
+            for number in range(cls.CATEGORIES)
+        ]
+        # В небольшой категории товаров мало, и обход всей ленты по дате
+        # с фильтрацией обходится дороже индекса по пути категории
+        cls.small_category = Category.objects.create(name="Марки", slug="stamps")
+        products = []
+        for number in range(cls.PRODUCTS):
+            if number % 400 == 1:
+                category = cls.small_category
+            else:
+                category = cls.categories[number % cls.CATEGORIES]
+            products.append(
+                Product(
+                    title=f"Товар {number}",
+                    description="Описание",
+                    price=Decimal(number % 5000),
+                    category=category,
+                    category_path=category.path,
+                    seller=cls.seller,
+                    location="Екатеринбург",
+                    # Каждый десятый товар уже продан
+                    status="sold" if number % 10 == 0 else "active",
+                    views_count=number % 997,
+                    favorites_count=number % 89,
+                    slug=f"product-{number}",
+                )
+            )
+        Product.objects.bulk_create(products, batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Product._meta.db_table}")
+
+    def setUp(self):
+        self.client = APIClient()
+        # Авторизованные запросы не попадают в кэш анонимной выдачи
+        self.client.force_authenticate(self.seller)
+
+    def get_page_plan(self, params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/products/", params)
+        self.assertEqual(response.status_code, 200)
+
+        page_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith('SELECT "baraholka_product"."id"')
+            and "LIMIT" in query["sql"]
+        ]
+        self.assertEqual(len(page_queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + page_queries[0])
+            plan = cursor.fetchone()[0]
+        return plan if isinstance(plan, list) else json.loads(plan)
+
+    def get_indexes(self, node):
+        indexes = set()
+        if "Index Name" in node:
+            indexes.add(node["Index Name"])
+        for child in node.get("Plans", []):
+            indexes |= self.get_indexes(child)
+        return indexes
+
+    def assertUsesIndex(self, params, index_name):
+        plan = self.get_page_plan(params)
+        self.assertIn(index_name, self.get_indexes(plan[0]["Plan"]), plan)
+
+    def test_default_ordering(self):
+        self.assertUsesIndex({}, "product_active_created_idx")
+
+    def test_cursor_pagination(self):
+        self.assertUsesIndex({"pagination": "cursor"}, "product_active_created_idx")
+
+    def test_price_range(self):
+        self.assertUsesIndex(
+            {"ordering": "price", "minPrice": "100", "maxPrice": "200"},
+            "product_active_price_idx",
+        )
+
+    def test_most_viewed(self):
+        self.assertUsesIndex({"ordering": "-views_count"}, "product_active_views_idx")
+
+    def test_most_saved(self):
+        self.assertUsesIndex(
+            {"ordering": "-favorites_count"}, "product_active_favorites_idx"
+        )
+
+    def test_category(self):
+        # Путь категории - первая колонка индекса, поэтому он подходит
+        # и без фильтра по цене
+        self.assertUsesIndex(
+            {"category": self.small_category.pk}, "product_active_cat_price_idx"
+        )
+
+    def test_category_price(self):
+        self.assertUsesIndex(
+            {
+                "category": self.small_category.pk,
+                "ordering": "price",
+                "minPrice": "100",
+                "maxPrice": "4000",
+            },
+            "product_active_cat_price_idx",
+        )
+
+
+class KeysetPaginationTests(TestCase):
+    """Курсорная выдача ленты: переходы вперед и назад, курсоры и count"""
+
+    PRICES = (100, 100, 100, 200, 200, 300, 300, 300, 300, 400, 500)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller")
+        category = Category.objects.create(name="Книги", slug="books")
+        # Одинаковые цены проверяют порядок по id внутри равных значений
+        Product.objects.bulk_create(
+            Product(
+                title=f"Товар {number}",
+                description="Описание",
+                price=Decimal(price),
+                category=category,
+                category_path=category.path,
+                seller=cls.seller,
+                location="Екатеринбург",
+                slug=f"product-{number}",
+            )
+            for number, price in enumerate(cls.PRICES)
+        )
+        cls.expected = list(
+            Product.objects.order_by("price", "id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller)
+
+    def get(self, url=None, **params):
+        if url is None:
+            params = {"pagination": "cursor", "ordering": "price", **params}
+            response = self.client.get("/api/products/", params)
+        else:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, data):
+        return [product["id"] for product in data["results"]]
+
+    def cursor(self, url):
+        encoded = parse_qs(urlsplit(url).query)["cursor"][0]
+        return parse_qs(b64decode(encoded).decode("ascii"))
+
+    def test_forward_and_backward(self):
+        pages = []
+        data = self.get(page_size=3)
+        self.assertIsNone(data["previous"])
+        while True:
+            pages.append(self.ids(data))
+            if data["next"] is None:
+                break
+            data = self.get(data["next"])
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+
+        # Назад по ссылкам previous те же страницы в обратном порядке
+        for page in reversed(pages[:-1]):
+            data = self.get(data["previous"])
+            self.assertEqual(self.ids(data), page)
+            self.assertIsNotNone(data["next"])
+        self.assertIsNone(data["previous"])
+
+    def test_cursor_encoding(self):
+        data = self.get(page_size=4)
+        last = Product.objects.get(pk=self.ids(data)[-1])
+        self.assertEqual(
+            self.cursor(data["next"]),
+            {"o": ["price"], "v": ["200.00"], "i": [str(last.pk)]},
+        )
+
+        data = self.get(data["next"])
+        self.assertEqual(self.cursor(data["previous"])["r"], ["1"])
+
+    def test_invalid_cursor(self):
+        for cursor in ("не base64", b64encode(b"o=price&v=x&i=1").decode()):
+            response = self.client.get(
+                "/api/products/",
+                {"pagination": "cursor", "ordering": "price", "cursor": cursor},
+            )
+            self.assertEqual(response.status_code, 404)
+
+        # Курсор другой сортировки
+        data = self.get(page_size=3)
+        response = self.client.get(
+            data["next"].replace("ordering=price", "ordering=-price")
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_count(self):
+        self.assertNotIn("count", self.get(page_size=3))
+        data = self.get(page_size=3, count="exact")
+        self.assertEqual(data["count"], len(self.PRICES))
+        self.assertEqual(self.get(data["next"])["count"], len(self.PRICES))
+
+
+@override_settings(PRODUCT_VIEWS_FLUSH_INTERVAL=1000)
+class ProductViewBufferTests(TestCase):
+    """Отложенная запись просмотров и ее сбои"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller")
+        cls.viewer = User.objects.create(username="viewer")
+        category = Category.objects.create(name="Книги", slug="books")
+        cls.product = Product.objects.create(
+            title="Книга",
+            description="Описание",
+            price=Decimal(100),
+            category=category,
+            seller=cls.seller,
+            location="Екатеринбург",
+            slug="book",
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = ProductViewBuffer()
+        # Запись в тестах идет явным вызовом flush
+        self.buffer._ensure_worker = lambda: None
+
+    def views_count(self):
+        return Product.objects.get(pk=self.product.pk).views_count
+
+    def test_flush_writes_views_and_counter(self):
+        self.assertTrue(self.buffer.record(self.product, user=self.viewer))
+        self.assertFalse(self.buffer.record(self.product, user=self.viewer))
+        self.assertTrue(self.buffer.record(self.product, ip_address="10.0.0.1"))
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.views_count(), 2)
+        self.assertEqual(ProductView.objects.count(), 2)
+
+    def test_viewer_is_counted_once_across_processes(self):
+        self.buffer.record(self.product, user=self.viewer)
+        self.buffer.flush()
+        # Другой процесс со своим локальным кэшем
+        cache.clear()
+        other = ProductViewBuffer()
+        other._ensure_worker = lambda: None
+        self.assertTrue(other.record(self.product, user=self.viewer))
+
+        self.assertEqual(other.flush(), 0)
+        self.assertEqual(self.views_count(), 1)
+
+    def test_view_time_is_recorded_time(self):
+        self.buffer.record(self.product, ip_address="10.0.0.1")
+        recorded_at = self.buffer._views[0][0].viewed_at
+        self.buffer.flush()
+        self.assertEqual(ProductView.objects.get().viewed_at, recorded_at)
+
+    def test_deleted_product_and_user_are_skipped(self):
+        gone = User.objects.create(username="gone")
+        self.buffer.record(self.product, user=gone)
+        self.buffer.record(self.product, user=self.viewer)
+        gone.delete()
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.buffer.record(self.product, ip_address="10.0.0.2")
+        Product.objects.filter(pk=self.product.pk).delete()
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer._views, [])
+
+    def test_bad_row_does_not_block_others(self):
+        self.buffer.record(self.product, ip_address="10.0.0.1")
+        # Некорректный адрес в обход проверки в представлении
+        self.buffer.record(self.product, ip_address="abc")
+
+        with self.assertLogs("baraholka", "ERROR"):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.buffer._views, [])
+        self.assertEqual(self.views_count(), 1)
+
+    def test_unavailable_database_retries_limited_times(self):
+        self.buffer.record(self.product, ip_address="10.0.0.1")
+        with mock.patch.object(
+            self.buffer, "write", side_effect=OperationalError("нет соединения")
+        ):
+            for _ in range(FLUSH_ATTEMPTS - 1):
+                with self.assertRaises(OperationalError):
+                    self.buffer.flush()
+                self.assertEqual(len(self.buffer._views), 1)
+            with self.assertLogs("baraholka", "ERROR"):
+                with self.assertRaises(OperationalError):
+                    self.buffer.flush()
+        self.assertEqual(self.buffer._views, [])
+
+    @override_settings(PRODUCT_VIEWS_FLUSH_INTERVAL=0)
+    def test_invalid_forwarded_ip_is_stored_as_null(self):
+        response = self.client.get(
+            f"/api/products/{self.product.slug}/", HTTP_X_FORWARDED_FOR="abc"
+        )
+        self.assertEqual(response.status_code, 200)
+        view = ProductView.objects.get()
+        self.assertIsNone(view.ip_address)
+        self.assertLessEqual(view.viewed_at, timezone.now())
+
+
+class FavoriteToggleTests(TestCase):
+    """Переключение избранного одним запросом и счетчик favorites_count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username="seller")
+        cls.buyer = User.objects.create(username="buyer")
+        cls.category = Category.objects.create(name="Книги", slug="books")
+
+    def setUp(self):
+        cache.clear()
+        self.product = self.create_product("book")
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def create_product(self, slug, status="active"):
+        return Product.objects.create(
+            title="Книга",
+            description="Описание",
+            price=Decimal(100),
+            category=self.category,
+            seller=self.seller,
+            location="Екатеринбург",
+            status=status,
+            slug=slug,
+        )
+
+    def toggle(self, product=None):
+        product = product or self.product
+        return self.client.post(f"/api/products/{product.slug}/toggle_favorite/")
+
+    def favorites_count(self):
+        return Product.objects.get(pk=self.product.pk).favorites_count
+
+    def test_add_and_remove(self):
+        response = self.toggle()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "added to favorites")
+        self.assertEqual(response.data["favorites_count"], 1)
+        self.assertTrue(
+            Favorite.objects.filter(user=self.buyer, product=self.product).exists()
+        )
+        self.assertEqual(self.client.get("/api/favorites/ids/").data, [self.product.pk])
+
+        response = self.toggle()
+        self.assertEqual(response.data["status"], "removed from favorites")
+        self.assertEqual(response.data["favorites_count"], 0)
+        self.assertFalse(Favorite.objects.exists())
+        self.assertEqual(self.client.get("/api/favorites/ids/").data, [])
+
+    def test_repeated_toggle_keeps_counter(self):
+        other = User.objects.create(username="other")
+        Favorite.objects.create(user=other, product=self.product)
+        for _ in range(5):
+            self.toggle()
+        self.assertEqual(self.favorites_count(), 2)
+        self.toggle()
+        self.assertEqual(self.favorites_count(), 1)
+
+    def test_inactive_product_can_only_be_removed(self):
+        sold = self.create_product("sold", status="sold")
+        self.assertEqual(self.toggle(sold).status_code, 400)
+
+        Favorite.objects.create(user=self.buyer, product=sold)
+        response = self.toggle(sold)
+        self.assertEqual(response.data["status"], "removed from favorites")
+
+    def test_counter_not_recounted_yet(self):
+        # Избранное, добавленное до появления поля favorites_count
+        Favorite.objects.create(user=self.buyer, product=self.product)
+        Product.objects.filter(pk=self.product.pk).update(favorites_count=0)
+
+        response = self.toggle()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["favorites_count"], 0)
+
+        favorite = Favorite.objects.create(user=self.buyer, product=self.product)
+        Product.objects.filter(pk=self.product.pk).update(favorites_count=0)
+        favorite.delete()
+        self.assertEqual(self.favorites_count(), 0)
+
+    def test_toggle_function(self):
+        self.assertEqual(toggle_favorite(self.buyer, self.product), (True, True, 1))
+        self.assertEqual(toggle_favorite(self.buyer, self.product), (False, True, 0))
+
+
+class ProductDetailConditionalTests(TestCase):
+    """Условный GET карточки товара сверяется только по ETag"""
+
+    def test_if_modified_since_is_ignored(self):
+        seller = User.objects.create(username="seller")
+        category = Category.objects.create(name="Книги", slug="books")
+        product = Product.objects.create(
+            title="Книга",
+            description="Описание",
+            price=Decimal(100),
+            category=category,
+            seller=seller,
+            location="Екатеринбург",
+            slug="book",
+        )
+        url = f"/api/products/{product.slug}/"
+        response = self.client.get(url)
+        self.assertNotIn("Last-Modified", response)
+
+        # Продавец сменил имя: updated_at товара прежний, а карточка другая
+        seller.first_name = "Иван"
+        seller.save()
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,17 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    """Сильный ETag из частей состояния ресурса"""
+    state = ":".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(state.encode()).hexdigest())
+
+
+def not_modified(request, etag=None, last_modified=None):
+    """Ответ 304, если валидаторы клиента совпадают, иначе None"""
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
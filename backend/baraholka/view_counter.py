@@ -0,0 +1,232 @@
+import atexit
+import ipaddress
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, DataError, IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Product, ProductView
+from .stats import start_of_day
+
+
+logger = logging.getLogger("baraholka")
+
+# Сколько раз пачка возвращается в буфер, если БД недоступна
+FLUSH_ATTEMPTS = 3
+# Ключ advisory-блокировки: записи из разных процессов идут по очереди,
+# чтобы проверка повторных просмотров видела записанное другими
+FLUSH_LOCK_ID = 0x76696577
+
+
+def client_ip(request):
+    """IP клиента; некорректное значение (X-Forwarded-For подделывается) - None"""
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded_for:
+        ip = forwarded_for.split(",")[0].strip()
+    else:
+        ip = request.META.get("REMOTE_ADDR")
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return None
+
+
+def viewer_key(product_id, user_id, ip_address, viewed_at):
+    """Зритель товара за день: пользователь, а для анонимов - IP"""
+    viewer = f"u{user_id}" if user_id is not None else f"ip{ip_address}"
+    return product_id, viewer, timezone.localdate(viewed_at)
+
+
+class ProductViewBuffer:
+    """
+    Учет просмотров товаров с отложенной записью.
+
+    Уникальные просмотры копятся в памяти и периодически записываются
+    фоновым потоком: одна пачка ProductView и по одному UPDATE
+    views_count = views_count + n на товар. Время просмотра фиксируется
+    при учете, а не при записи.
+
+    Повторный просмотр за день сначала отсекается cache.add, но кэш
+    локален для процесса, поэтому при записи пачка еще раз сверяется с
+    ProductView за день - так зритель учитывается один раз при любом
+    числе процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # Элементы - (просмотр, число неудачных попыток записи)
+        self._views = []
+        self._worker = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, "PRODUCT_VIEWS_FLUSH_INTERVAL", 10)
+
+    @property
+    def max_size(self):
+        return getattr(settings, "PRODUCT_VIEWS_BUFFER_SIZE", 500)
+
+    def record(self, product, user=None, ip_address=None):
+        """Учет просмотра; возвращает False, если зритель уже смотрел товар сегодня"""
+        now = timezone.localtime()
+        viewer = f"u{user.pk}" if user is not None else f"ip{ip_address}"
+        key = f"product_view:{now.date().isoformat()}:{product.pk}:{viewer}"
+        end_of_day = timezone.make_aware(
+            datetime.combine(now.date() + timedelta(days=1), time.min)
+        )
+        timeout = max(int((end_of_day - now).total_seconds()), 1)
+        if not cache.add(key, 1, timeout):
+            return False
+
+        view = ProductView(
+            product_id=product.pk, user=user, ip_address=ip_address, viewed_at=now
+        )
+        with self._lock:
+            self._views.append((view, 0))
+            is_full = len(self._views) >= self.max_size
+
+        if not self.flush_interval:
+            self.flush()
+            return True
+
+        self._ensure_worker()
+        if is_full:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Запись накопленных просмотров в БД; возвращает число записанных"""
+        with self._lock:
+            entries, self._views = self._views, []
+
+        if not entries:
+            return 0
+
+        views = [view for view, _ in entries]
+        try:
+            return self.write(views)
+        except (DataError, IntegrityError):
+            # Некорректная строка не должна задерживать остальные: пачка
+            # записывается по одному просмотру, такие строки отбрасываются
+            logger.exception("Ошибка записи пачки просмотров, запись по одному")
+            return sum(self.write_one(view) for view in views)
+        except DatabaseError:
+            # БД недоступна: пачка возвращается в буфер, но не бесконечно
+            retry = [
+                (view, attempts + 1)
+                for view, attempts in entries
+                if attempts + 1 < FLUSH_ATTEMPTS
+            ]
+            if len(retry) < len(entries):
+                logger.error(
+                    "Отброшено просмотров после %s попыток записи: %s",
+                    FLUSH_ATTEMPTS,
+                    len(entries) - len(retry),
+                )
+            with self._lock:
+                self._views[:0] = retry
+            raise
+
+    def write_one(self, view):
+        try:
+            return self.write([view])
+        except DatabaseError:
+            logger.exception("Просмотр товара %s не записан", view.product_id)
+            return 0
+
+    def write(self, views):
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [FLUSH_LOCK_ID])
+            views = self.new_views(views)
+            ProductView.objects.bulk_create(views, batch_size=self.max_size)
+            increments = Counter(view.product_id for view in views)
+            # Сортировка по id задает одинаковый порядок блокировок строк
+            for product_id, count in sorted(increments.items()):
+                Product.objects.filter(pk=product_id).update(
+                    views_count=F("views_count") + count
+                )
+        return len(views)
+
+    def new_views(self, views):
+        """Просмотры, которых еще нет в БД за тот же день"""
+        # Товар или пользователя могли удалить, пока просмотр ждал записи
+        product_ids = set(
+            Product.objects.filter(
+                pk__in={view.product_id for view in views}
+            ).values_list("pk", flat=True)
+        )
+        user_ids = set(
+            User.objects.filter(
+                pk__in={view.user_id for view in views if view.user_id is not None}
+            ).values_list("pk", flat=True)
+        )
+        views = [
+            view
+            for view in views
+            if view.product_id in product_ids
+            and (view.user_id is None or view.user_id in user_ids)
+        ]
+        if not views:
+            return views
+
+        ips = {view.ip_address for view in views if view.user_id is None}
+        viewers = Q(user_id__in=user_ids) | Q(
+            user__isnull=True, ip_address__in=ips - {None}
+        )
+        if None in ips:
+            viewers |= Q(user__isnull=True, ip_address__isnull=True)
+        existing = ProductView.objects.filter(
+            viewers,
+            product_id__in=product_ids,
+            viewed_at__gte=start_of_day(
+                min(timezone.localdate(view.viewed_at) for view in views)
+            ),
+        ).values_list("product_id", "user_id", "ip_address", "viewed_at")
+        seen = {viewer_key(*row) for row in existing}
+
+        new = []
+        for view in views:
+            key = viewer_key(
+                view.product_id, view.user_id, view.ip_address, view.viewed_at
+            )
+            if key not in seen:
+                seen.add(key)
+                new.append(view)
+        return new
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="product-views-flush", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ошибка записи просмотров товаров")
+            finally:
+                connection.close()
+
+
+product_views = ProductViewBuffer()
+
+# Не теряем накопленное при штатной остановке процесса
+atexit.register(product_views.flush)
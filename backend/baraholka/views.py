@@ -2,25 +2,70 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import (
+    Count,
+    Max,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import User
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from .models import UserProfile, Category, Product, Favorite, Chat, Message, ProductView
+from .models import UserProfile, Category, Product, Favorite, Chat, Message
+from . import bulk
+from .categories import category_tree
+from .favorites import get_favorite_ids, toggle_favorite
+from .filters import ProductSearchFilter
+from .images import add_product_images, remove_product_images, reorder_product_images
+from .list_cache import product_list_cache
+from .pagination import KeysetPagination
+from .realtime import publish_chat_event
+from .utils import make_etag, not_modified
+from .view_counter import client_ip, product_views
+from .stats import get_daily_stats, get_top_products, increment_daily_stat
 from .serializers import (
     UserProfileSerializer,
     CategorySerializer,
     ProductListSerializer,
     ProductDetailSerializer,
     ProductCreateUpdateSerializer,
+    ProductImageSerializer,
+    ProductImageUploadSerializer,
+    ProductImageIdsSerializer,
     FavoriteSerializer,
     ChatSerializer,
     MessageSerializer,
 )
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.utils.dateparse import parse_datetime
 from django.utils import timezone
 from django.db.models import F
 from datetime import datetime, time
 from django.db import IntegrityError
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+import hashlib
+
+
+# Подсказки строки поиска
+SUGGEST_MIN_LENGTH = 2
+SUGGEST_MAX_LENGTH = 50
+SUGGEST_PRODUCTS_LIMIT = 5
+SUGGEST_CATEGORIES_LIMIT = 3
+SUGGEST_CACHE_TIMEOUT = 60
+
+# Статистика для продавцов: период по умолчанию и максимальный, в днях
+STATS_DEFAULT_DAYS = 7
+STATS_MAX_DAYS = 90
+STATS_CACHE_TIMEOUT = 300
+
+# Порция сообщений для дозагрузки чата (after_id, since, before_id, latest)
+MESSAGES_BATCH_SIZE = 50
 
 
 class UserProfileViewSet(viewsets.ModelViewSet):
@@ -59,21 +104,110 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return [permissions.IsAdminUser()]
         return [permissions.IsAuthenticatedOrReadOnly()]
 
+    def list(self, request, *args, **kwargs):
+        # Параметры фильтрации и сортировки обрабатываются без кэша
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, "list")
+
+    @action(detail=False)
+    def tree(self, request):
+        """Вложенное дерево категорий"""
+        return self.cached_response(request, "tree")
+
+    def cached_response(self, request, kind):
+        entry = category_tree.get(request)
+        etag = entry[f"{kind}_etag"]
+        response = not_modified(request, etag=etag)
+        if response is None:
+            response = Response(entry[kind])
+        response["ETag"] = etag
+        return response
+
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Поиск идет после сортировки, чтобы без явного ordering ранжировать по релевантности
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
         filters.OrderingFilter,
+        ProductSearchFilter,
     ]
-    filterset_fields = ["category", "subcategory", "condition", "status", "location"]
-    search_fields = ["title", "description"]
-    ordering_fields = ["price", "created_at", "views_count"]
+    # category и subcategory фильтруются в get_queryset по пути в дереве
+    filterset_fields = ["condition", "status", "location"]
+    ordering_fields = ["price", "created_at", "views_count", "favorites_count"]
     ordering = ["-created_at"]
     lookup_field = "slug"
 
+    @property
+    def paginator(self):
+        """Для бесконечной ленты список можно запросить с pagination=cursor"""
+        if not hasattr(self, "_paginator") and self.action == "list":
+            if self.request.query_params.get("pagination") == "cursor":
+                self._paginator = KeysetPagination()
+        return super().paginator
+
+    def list(self, request, *args, **kwargs):
+        # Анонимная выдача одинакова для всех, поэтому ее можно кэшировать
+        cache_key = None
+        if not request.user.is_authenticated:
+            cache_key = product_list_cache.make_key(request)
+            entry = product_list_cache.get(cache_key)
+            if entry is not None:
+                response = not_modified(request, etag=entry["etag"])
+                if response is None:
+                    response = Response(entry["data"])
+                return self.set_validators(response, entry["etag"])
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            queryset = queryset.prefetch_related("images")
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        # Страница не изменилась, если те же товары в тех же версиях, то же
+        # избранное и та же обвязка пагинации; тогда сериализация не нужна
+        favorite_ids = get_favorite_ids(request.user)
+        etag = make_etag(
+            request.build_absolute_uri("/"),
+            category_tree.get_version(),
+            self.get_paginated_response([]).data,
+            sorted(favorite_ids.intersection(product.pk for product in page)),
+            *(
+                (
+                    product.pk,
+                    product.updated_at.timestamp(),
+                    product.views_count,
+                    product.favorites_count,
+                )
+                for product in page
+            ),
+        )
+        response = not_modified(request, etag=etag)
+        if response is None:
+            prefetch_related_objects(page, "images")
+            serializer = self.get_serializer(
+                page,
+                many=True,
+                context={**self.get_serializer_context(), "favorite_ids": favorite_ids},
+            )
+            response = self.get_paginated_response(serializer.data)
+            if cache_key is not None:
+                product_list_cache.set(cache_key, {"data": response.data, "etag": etag})
+        return self.set_validators(response, etag)
+
+    def set_validators(self, response, etag):
+        response["ETag"] = etag
+        # no-cache: промежуточные кэши хранят ответ, но сверяют его с сервером,
+        # поэтому просмотры товаров продолжают учитываться
+        cache_control = {"no_cache": True}
+        if self.request.user.is_authenticated:
+            cache_control["private"] = True
+        patch_cache_control(response, **cache_control)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return ProductCreateUpdateSerializer
@@ -102,20 +236,34 @@ class ProductViewSet(viewsets.ModelViewSet):
             if max_price and max_price.isdigit():
                 queryset = queryset.filter(price__lte=max_price)
 
-            # Фильтрация по категориям
-            category = self.request.query_params.get("category")
-            if category:
-                queryset = queryset.filter(
-                    Q(category_id=category)  # Товары из основной категории
-                    | Q(subcategory__parent_id=category)  # Товары из подкатегорий
-                )
-
-            # Фильтрация по подкатегории
-            subcategory = self.request.query_params.get("subcategory")
-            if subcategory:
-                queryset = queryset.filter(subcategory_id=subcategory)
-
-        return queryset.select_related("category", "subcategory", "seller")
+            # Фильтрация по категории и подкатегории: товары всего поддерева
+            # по материализованному пути, без join к Category
+            for param in ("category", "subcategory"):
+                category = self.request.query_params.get(param)
+                if category:
+                    path = category.isdigit() and category_tree.get_paths().get(
+                        int(category)
+                    )
+                    if category.isdigit() and path is None:
+                        # Категорию могли создать в другом процессе, и в
+                        # дереве этого процесса ее еще нет
+                        path = (
+                            Category.objects.filter(pk=category)
+                            .values_list("path", flat=True)
+                            .first()
+                        )
+                    if path:
+                        queryset = queryset.filter(category_path__startswith=path)
+                    else:
+                        queryset = queryset.none()
+
+        # Изображения не входят в ETag (их изменение меняет updated_at),
+        # поэтому загружаются только при сериализации
+        queryset = queryset.select_related("category", "subcategory", "seller")
+        if self.action == "retrieve":
+            # Все, что входит в ETag карточки, выбирается одним запросом
+            queryset = queryset.select_related("seller__profile")
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(seller=self.request.user)
@@ -132,55 +280,256 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         # Не считаем просмотры от владельца товара
         if request.user != instance.seller:
-            # Получаем IP адрес
-            x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(",")[0]
-            else:
-                ip = request.META.get("REMOTE_ADDR")
-
-            # Создаем запись о просмотре
-            view = ProductView(
-                product=instance,
+            # Просмотр записывается в БД позже, пачкой вместе с остальными
+            product_views.record(
+                instance,
                 user=request.user if request.user.is_authenticated else None,
-                ip_address=ip,
+                ip_address=client_ip(request),
             )
-            view.save()  # Сохранение с проверкой уникальности
 
-            # Обновляем общее количество просмотров
-            instance.views_count = ProductView.objects.filter(product=instance).count()
-            instance.save(update_fields=["views_count"])
-
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        # Просмотр уже учтен, поэтому при совпадении валидатора
+        # карточку можно не сериализовать
+        seller = instance.seller
+        profile = getattr(seller, "profile", None)
+        favorite_ids = get_favorite_ids(request.user)
+        etag = make_etag(
+            request.build_absolute_uri("/"),
+            category_tree.get_version(),
+            instance.pk,
+            instance.updated_at.timestamp(),
+            instance.views_count,
+            instance.favorites_count,
+            instance.pk in favorite_ids,
+            seller.username,
+            seller.email,
+            seller.first_name,
+            seller.last_name,
+            profile and profile.phone_number,
+        )
+        # Только ETag: updated_at не покрывает просмотры, избранное, продавца
+        # и категории, поэтому Last-Modified дал бы 304 на измененную карточку
+        response = not_modified(request, etag=etag)
+        if response is None:
+            serializer = self.get_serializer(
+                instance,
+                context={**self.get_serializer_context(), "favorite_ids": favorite_ids},
+            )
+            response = Response(serializer.data)
+        return self.set_validators(response, etag)
 
     @action(detail=True, methods=["post"])
     def toggle_favorite(self, request, slug=None):
         """Добавление/удаление товара из избранного"""
         product = self.get_object()
-        favorite = Favorite.objects.filter(user=request.user, product=product)
+        is_favorite, changed, favorites_count = toggle_favorite(request.user, product)
 
-        if favorite.exists():
-            favorite.delete()
-            return Response({"status": "removed from favorites"})
-
-        # Проверяем статус товара перед добавлением в избранное
-        if product.status != "active":
+        if not is_favorite and not changed:
+            # Проверяем статус товара перед добавлением в избранное
             return Response(
                 {"error": "Нельзя добавить в избранное неактивное объявление"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        Favorite.objects.create(user=request.user, product=product)
-        return Response({"status": "added to favorites"})
+        if favorites_count is None:
+            favorites_count = product.favorites_count
+        if not is_favorite:
+            return Response(
+                {
+                    "status": "removed from favorites",
+                    "favorites_count": favorites_count,
+                }
+            )
+
+        return Response(
+            {"status": "added to favorites", "favorites_count": favorites_count}
+        )
+
+    def get_own_product(self):
+        product = self.get_object()
+        if product.seller != self.request.user:
+            raise PermissionDenied("Изменять изображения может только продавец")
+        return product
+
+    def images_response(self, product, status_code=status.HTTP_200_OK):
+        serializer = ProductImageSerializer(
+            product.images.all(), many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status_code)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="images",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def add_images(self, request, slug=None):
+        """Добавление изображений в конец галереи без перезагрузки остальных"""
+        product = self.get_own_product()
+        serializer = ProductImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add_product_images(product, serializer.validated_data["images"])
+        return self.images_response(product, status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="images/remove",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def remove_images(self, request, slug=None):
+        """Удаление изображений по id"""
+        product = self.get_own_product()
+        serializer = ProductImageIdsSerializer(
+            data=request.data, context={"product": product}
+        )
+        serializer.is_valid(raise_exception=True)
+        remove_product_images(product, serializer.validated_data["ids"])
+        return self.images_response(product)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="images/reorder",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def reorder_images(self, request, slug=None):
+        """Порядок галереи: переданные id идут первыми в указанном порядке"""
+        product = self.get_own_product()
+        serializer = ProductImageIdsSerializer(
+            data=request.data, context={"product": product}
+        )
+        serializer.is_valid(raise_exception=True)
+        reorder_product_images(product, serializer.validated_data["ids"])
+        return self.images_response(product)
+
+    @action(
+        detail=False,
+        url_path="export",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def export_products(self, request):
+        """Потоковая выгрузка товаров текущего пользователя (file_format=jsonl|csv)"""
+        file_format = request.query_params.get("file_format", "jsonl")
+        if file_format not in bulk.FORMATS:
+            raise ValidationError(
+                {"file_format": [f"Допустимо: {', '.join(bulk.FORMATS)}"]}
+            )
+
+        lines = bulk.export_products(
+            Product.objects.filter(seller=request.user), file_format
+        )
+        if isinstance(request._request, ASGIRequest):
+            lines = bulk.aiter_lines(lines)
+        response = StreamingHttpResponse(
+            lines, content_type=bulk.CONTENT_TYPES[file_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="products.{file_format}"'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def import_products(self, request):
+        """Импорт товаров из файла JSONL или CSV с отчетом об ошибках по строкам"""
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": ["Файл не передан"]})
+        file_format = request.data.get("file_format") or bulk.guess_format(upload.name)
+        if file_format not in bulk.FORMATS:
+            raise ValidationError(
+                {"file_format": [f"Допустимо: {', '.join(bulk.FORMATS)}"]}
+            )
+
+        report = bulk.ProductImporter(request.user).run(
+            bulk.open_text(upload), file_format
+        )
+        response_status = (
+            status.HTTP_201_CREATED
+            if report["created"]
+            else status.HTTP_400_BAD_REQUEST
+        )
+        return Response(report, status=response_status)
+
+    def get_stats_days(self, request):
+        days = request.query_params.get("days", "")
+        if not days.isdigit():
+            return STATS_DEFAULT_DAYS
+        return min(max(int(days), 1), STATS_MAX_DAYS)
+
+    @action(detail=True, permission_classes=[permissions.IsAuthenticated])
+    def stats(self, request, slug=None):
+        """Статистика просмотров, избранного и чатов товара по дням"""
+        product = self.get_object()
+        if product.seller != request.user:
+            return Response(
+                {"detail": "Статистика доступна только продавцу"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        days = self.get_stats_days(request)
+        cache_key = f"product_stats:{product.id}:{days}"
+        data = cache.get(cache_key)
+        if data is None:
+            data = get_daily_stats(Product.objects.filter(pk=product.pk), days)
+            cache.set(cache_key, data, STATS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(
+        detail=False,
+        url_path="my_products/stats",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def my_products_stats(self, request):
+        """Сводная статистика по всем товарам текущего пользователя"""
+        days = self.get_stats_days(request)
+        cache_key = f"seller_stats:{request.user.id}:{days}"
+        data = cache.get(cache_key)
+        if data is None:
+            products = Product.objects.filter(seller=request.user)
+            data = get_daily_stats(products, days)
+            data["top_products"] = get_top_products(products, days)
+            cache.set(cache_key, data, STATS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, pagination_class=None)
+    def suggest(self, request):
+        """Подсказки для строки поиска: названия товаров и категорий"""
+        # Нормализуем запрос, чтобы "Айфон " и "айфон" попадали в один ключ кэша
+        query = " ".join(request.query_params.get("search", "").split()).lower()
+        query = query[:SUGGEST_MAX_LENGTH]
+        if len(query) < SUGGEST_MIN_LENGTH:
+            return Response({"products": [], "categories": []})
+
+        cache_key = "suggest:" + hashlib.md5(query.encode()).hexdigest()
+        data = cache.get(cache_key)
+        if data is None:
+            products = (
+                Product.objects.filter(status="active", title__icontains=query)
+                .order_by("-views_count")
+                .values("id", "title", "slug", "price")[:SUGGEST_PRODUCTS_LIMIT]
+            )
+            categories = Category.objects.filter(name__icontains=query).values(
+                "id", "name", "slug"
+            )[:SUGGEST_CATEGORIES_LIMIT]
+            data = {"products": list(products), "categories": list(categories)}
+            cache.set(cache_key, data, SUGGEST_CACHE_TIMEOUT)
+
+        return Response(data)
 
     @action(detail=False)
     def my_products(self, request):
         """Получение списка товаров текущего пользователя"""
         queryset = self.get_queryset().filter(seller=request.user)
         # Для личных товаров игнорируем фильтр по статусу
-        queryset = Product.objects.filter(seller=request.user).select_related(
-            "category", "subcategory", "seller"
+        queryset = (
+            Product.objects.filter(seller=request.user)
+            .select_related("category", "subcategory", "seller")
+            .prefetch_related("images")
         )
         serializer = ProductListSerializer(
             queryset, many=True, context={"request": request}
@@ -193,23 +542,80 @@ class FavoriteViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Favorite.objects.filter(
-            user=self.request.user,
-            product__status="active",  # Показываем только активные товары в избранном
-        ).select_related("product", "product__category", "product__seller")
+        return (
+            Favorite.objects.filter(
+                user=self.request.user,
+                product__status="active",  # Показываем только активные товары в избранном
+            )
+            .select_related(
+                "product",
+                "product__category",
+                "product__subcategory",
+                "product__seller",
+            )
+            .prefetch_related("product__images")
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
 
+    @action(detail=False, pagination_class=None)
+    def ids(self, request):
+        """id избранных товаров пользователя, без данных самих товаров"""
+        return Response(sorted(get_favorite_ids(request.user)))
+
 
 class ChatViewSet(viewsets.ModelViewSet):
     serializer_class = ChatSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Chat.objects.filter(participants=self.request.user)
+        user = self.request.user
+
+        # Последнее сообщение и число непрочитанных считаются подзапросами
+        # в одном запросе, а не отдельно для каждого чата
+        chat_messages = Message.objects.filter(chat=OuterRef("pk"))
+        last_message_at = chat_messages.order_by("-created_at", "-id").values(
+            "created_at"
+        )[:1]
+        unread_count = (
+            chat_messages.filter(is_read=False)
+            .exclude(sender=user)
+            .values("chat")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+
+        return (
+            Chat.objects.filter(participants=user)
+            .annotate(
+                last_activity=Coalesce(Subquery(last_message_at), "created_at"),
+                unread_messages_count=Coalesce(Subquery(unread_count), 0),
+            )
+            .select_related(
+                "product",
+                "product__category",
+                "product__subcategory",
+                "product__seller",
+            )
+            .prefetch_related(
+                "product__images",
+                Prefetch(
+                    "participants",
+                    queryset=User.objects.select_related("profile"),
+                ),
+                Prefetch(
+                    "messages",
+                    queryset=Message.objects.select_related("sender").order_by(
+                        "-created_at", "-id"
+                    )[:1],
+                    to_attr="latest_messages",
+                ),
+            )
+            .order_by("-last_activity", "-id")
+        )
 
     def create(self, request, *args, **kwargs):
         product_id = request.data.get("product")
@@ -234,6 +640,7 @@ class ChatViewSet(viewsets.ModelViewSet):
 
         chat = Chat.objects.create(product=product)
         chat.participants.add(request.user, product.seller)
+        increment_daily_stat(product.id, "chats_opened")
 
         serializer = self.get_serializer(chat)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -242,10 +649,78 @@ class ChatViewSet(viewsets.ModelViewSet):
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Сообщения не редактируются и не удаляются: на этом держится ETag списка
+    http_method_names = ["get", "post", "head", "options"]
 
     def get_queryset(self):
         chat_id = self.kwargs.get("chat_pk")
-        return Message.objects.filter(chat_id=chat_id)
+        return Message.objects.filter(
+            chat_id=chat_id, chat__participants=self.request.user
+        ).select_related("sender")
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+
+        # Состояние чата меняется только при новых и прочитанных сообщениях;
+        # оба запроса идут по индексам и не обходят всю переписку
+        last_id = queryset.aggregate(last_id=Max("id"))["last_id"]
+        unread = queryset.filter(is_read=False).count()
+        etag = make_etag(
+            self.kwargs.get("chat_pk"),
+            last_id,
+            unread,
+            request.query_params.urlencode(),
+        )
+
+        response = not_modified(request, etag=etag)
+        if response is None:
+            response = self.list_messages(request, queryset)
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def list_messages(self, request, queryset):
+        """
+        Сообщения чата порциями:
+        after_id / since - только новые, before_id - более старые
+        (подгрузка истории), latest - последние сообщения чата.
+        Без параметров используется обычная постраничная выдача.
+        """
+        params = request.query_params
+        after_id = params.get("after_id")
+        since = params.get("since")
+        before_id = params.get("before_id")
+
+        for name, value in (("after_id", after_id), ("before_id", before_id)):
+            if value is not None and not value.isdigit():
+                raise ValidationError({name: ["Ожидается целое число"]})
+
+        if after_id is not None or since is not None:
+            if after_id is not None:
+                queryset = queryset.filter(id__gt=after_id)
+            if since is not None:
+                try:
+                    since_dt = parse_datetime(since)
+                except ValueError:
+                    # Формат верный, но такой даты нет (2024-02-30)
+                    since_dt = None
+                if since_dt is None:
+                    raise ValidationError({"since": ["Неверный формат даты"]})
+                queryset = queryset.filter(created_at__gt=since_dt)
+            messages = list(queryset.order_by("id")[: MESSAGES_BATCH_SIZE + 1])
+            has_more = len(messages) > MESSAGES_BATCH_SIZE
+            messages = messages[:MESSAGES_BATCH_SIZE]
+        elif before_id is not None or params.get("latest"):
+            if before_id is not None:
+                queryset = queryset.filter(id__lt=before_id)
+            messages = list(queryset.order_by("-id")[: MESSAGES_BATCH_SIZE + 1])
+            has_more = len(messages) > MESSAGES_BATCH_SIZE
+            messages = messages[:MESSAGES_BATCH_SIZE][::-1]
+        else:
+            return super().list(request)
+
+        serializer = self.get_serializer(messages, many=True)
+        return Response({"results": serializer.data, "has_more": has_more})
 
     def perform_create(self, serializer):
         chat_id = self.kwargs.get("chat_pk")
@@ -256,6 +731,7 @@ class MessageViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Вы не являетесь участником этого чата")
 
         serializer.save(sender=self.request.user, chat=chat)
+        publish_chat_event(chat.id, {"type": "message", "message": serializer.data})
 
     @action(detail=False, methods=["post"])
     def mark_as_read(self, request, chat_pk=None):
@@ -263,8 +739,12 @@ class MessageViewSet(viewsets.ModelViewSet):
         if request.user not in chat.participants.all():
             raise PermissionDenied("Вы не являетесь участником этого чата")
 
-        Message.objects.filter(chat=chat, is_read=False).exclude(
-            sender=request.user
-        ).update(is_read=True)
+        updated = (
+            Message.objects.filter(chat=chat, is_read=False)
+            .exclude(sender=request.user)
+            .update(is_read=True)
+        )
+        if updated:
+            publish_chat_event(chat.id, {"type": "read", "reader": request.user.id})
 
         return Response({"status": "messages marked as read"})
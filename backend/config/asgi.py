@@ -4,4 +4,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Импорт после инициализации Django: обработчик использует модели
+from baraholka.realtime import chat_socket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await chat_socket(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "django_filters",
     "baraholka.apps.BaraholkaConfig",
@@ -32,6 +33,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы общее время в Server-Timing включало остальные middleware
+    "baraholka.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -66,7 +69,7 @@ CORS_ALLOW_HEADERS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "authentication.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
@@ -94,8 +97,15 @@ SIMPLE_JWT = {
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
+    # Использованный refresh-токен отзывается (authentication.revocation)
+    "TOKEN_REFRESH_SERIALIZER": "authentication.serializers.RevokingTokenRefreshSerializer",
 }
 
+# Как часто процесс дочитывает из БД токены, отозванные другими процессами.
+# С локальным кэшем это и есть задержка, с которой отзыв (выход, повторное
+# использование refresh-токена) действует в остальных процессах
+TOKEN_REVOCATION_SYNC_INTERVAL = int(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", 30))
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -130,6 +140,59 @@ DATABASES = {
     }
 }
 
+# Локальный кэш процесса. При нескольких процессах нужен общий бэкенд
+# (например, Redis), иначе сброс кэша виден только изменившему процессу
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "baraholka",
+    },
+    "product_list": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "baraholka-product-list",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# Срок версии дерева категорий (секунды): с локальным кэшем default
+# изменения категорий доходят до остальных процессов не позже него
+CATEGORY_TREE_CACHE_TIMEOUT = int(os.getenv("CATEGORY_TREE_CACHE_TIMEOUT", 60))
+
+# Кэш анонимной выдачи списка товаров
+PRODUCT_LIST_CACHE_ALIAS = "product_list"
+PRODUCT_LIST_CACHE_TIMEOUT = int(os.getenv("PRODUCT_LIST_CACHE_TIMEOUT", 60))
+
+# Отложенная запись просмотров товаров (секунды / размер пачки)
+PRODUCT_VIEWS_FLUSH_INTERVAL = int(os.getenv("PRODUCT_VIEWS_FLUSH_INTERVAL", 10))
+PRODUCT_VIEWS_BUFFER_SIZE = int(os.getenv("PRODUCT_VIEWS_BUFFER_SIZE", 500))
+# Срок хранения сырых просмотров; старше - только дневная статистика
+PRODUCT_VIEWS_RETENTION_DAYS = int(os.getenv("PRODUCT_VIEWS_RETENTION_DAYS", 30))
+
+# Производные изображения товаров: наибольшая сторона в пикселях,
+# качество WebP и число фоновых потоков (0 - обработка сразу в запросе)
+PRODUCT_IMAGE_THUMBNAIL_SIZE = int(os.getenv("PRODUCT_IMAGE_THUMBNAIL_SIZE", 400))
+PRODUCT_IMAGE_LARGE_SIZE = int(os.getenv("PRODUCT_IMAGE_LARGE_SIZE", 1600))
+PRODUCT_IMAGE_WEBP_QUALITY = int(os.getenv("PRODUCT_IMAGE_WEBP_QUALITY", 80))
+PRODUCT_IMAGE_WORKERS = int(os.getenv("PRODUCT_IMAGE_WORKERS", 2))
+
+# Время жизни кэша пользователей JWT-аутентификации в процессе (секунды,
+# 0 - без кэша). С локальным кэшем default изменения пользователя и
+# профиля доходят до остальных процессов не позже этого срока
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", 60))
+
+# Журнал медленных запросов (логгер baraholka.slow_requests): запрос
+# попадает в него дольше порога в миллисекундах или с большим числом
+# запросов к БД
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 1000))
+SLOW_REQUEST_QUERIES = int(os.getenv("SLOW_REQUEST_QUERIES", 30))
+
+# Метрики /metrics. При нескольких рабочих процессах у каждого свой файл
+# в METRICS_DIR (каталог очищается при развертывании); без него отдаются
+# метрики только ответившего процесса
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1 ::1").split(" ")
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
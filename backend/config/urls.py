@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from baraholka.metrics import metrics_view
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include("authentication.urls")),
     path("api/", include("baraholka.urls")),
+    path("metrics", metrics_view),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -15,8 +15,22 @@ export const updateProductStatus = (slug, status) => axios.patch(`/products/${sl
 export const deleteProduct = slug => axios.delete(`/products/${slug}/`);
 export const toggleFavorite = slug => axios.post(`/products/${slug}/toggle_favorite/`);
 
+// Импорт и выгрузка товаров (file_format: jsonl или csv)
+export const importProducts = (data, config) => axios.post('/products/import/', data, config);
+export const exportProducts = fileFormat =>
+  axios.get('/products/export/', { params: { file_format: fileFormat }, responseType: 'blob' });
+
+// Галерея товара
+export const addProductImages = (slug, data, config) =>
+  axios.post(`/products/${slug}/images/`, data, config);
+export const removeProductImages = (slug, ids) =>
+  axios.post(`/products/${slug}/images/remove/`, { ids });
+export const reorderProductImages = (slug, ids) =>
+  axios.post(`/products/${slug}/images/reorder/`, { ids });
+
 // Категории
 export const getCategories = () => axios.get('/categories/');
+export const getCategoryTree = () => axios.get('/categories/tree/');
 export const getCategory = slug => axios.get(`/categories/${slug}/`);
 
 // Профиль
@@ -25,16 +39,31 @@ export const updateProfile = data => axios.patch('/profiles/my_profile/', data);
 
 // Избранное
 export const getFavorites = () => axios.get('/favorites/');
+export const getFavoriteIds = () => axios.get('/favorites/ids/');
 
 // Мои товары
 export const getMyProducts = () => axios.get('/products/my_products/');
 
+// Статистика продавца
+export const getProductStats = (slug, days) =>
+  axios.get(`/products/${slug}/stats/`, { params: { days } });
+export const getMyProductsStats = days =>
+  axios.get('/products/my_products/stats/', { params: { days } });
+
 // Чаты
 export const getChats = () => axios.get('/chats/');
 export const getChat = id => axios.get(`/chats/${id}/`);
 export const createChat = productId => axios.post('/chats/', { product: productId });
 
 // Сообщения
-export const getChatMessages = chatId => axios.get(`/chats/${chatId}/messages/`);
+export const getChatMessages = (chatId, params) =>
+  axios.get(`/chats/${chatId}/messages/`, { params });
 export const sendMessage = (chatId, text) => axios.post(`/chats/${chatId}/messages/`, { text });
 export const markMessagesAsRead = chatId => axios.post(`/chats/${chatId}/messages/mark_as_read/`);
+
+// Адрес WebSocket с событиями чата (новые сообщения и отметки о прочтении)
+export const getChatSocketUrl = (chatId, token) => {
+  const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
+  const baseUrl = apiUrl.replace(/^http/, 'ws').replace(/\/api\/?$/, '');
+  return `${baseUrl}/ws/chats/${chatId}/?token=${encodeURIComponent(token)}`;
+};
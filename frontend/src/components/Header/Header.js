@@ -167,8 +167,10 @@ function Header() {
 
       setIsLoading(true);
       try {
-        const response = await axios.get(`/api/products/?search=${encodeURIComponent(query)}`);
-        setSearchResults(response.data.results.slice(0, 5));
+        const response = await axios.get(
+          `/api/products/suggest/?search=${encodeURIComponent(query)}`
+        );
+        setSearchResults(response.data.products);
       } catch (error) {
         console.error('Ошибка при поиске:', error);
         setSearchResults([]);
@@ -23,7 +23,10 @@ import {
   markMessagesAsRead,
   fetchChats,
   setCurrentChat,
+  messageReceived,
+  messagesRead,
 } from '../../store/slices/chatSlice';
+import { getChatSocketUrl } from '../../api';
 import { formatDateTime } from '../../utils/dateUtils';
 
 const MotionContainer = motion(Container);
@@ -90,19 +93,55 @@ function ChatPage() {
 
     loadInitialData();
 
-    let intervalId = null;
+    let socket = null;
+    let reconnectTimeout = null;
+    let closed = false;
+
+    // Новые сообщения и отметки о прочтении приходят через WebSocket
+    const connect = () => {
+      const token = localStorage.getItem('token');
+      if (!token) {
+        return;
+      }
+
+      console.log('ChatPage: Подключение к WebSocket чата');
+      socket = new WebSocket(getChatSocketUrl(chatId, token));
+      socket.onmessage = event => {
+        const data = JSON.parse(event.data);
+        if (data.type === 'message') {
+          dispatch(messageReceived(data.message));
+          if (data.message.sender !== user.id) {
+            setMessagesMarkedAsRead(false);
+          }
+        } else if (data.type === 'read') {
+          dispatch(messagesRead(data.reader));
+        }
+      };
+      socket.onclose = event => {
+        // 4403/4404 - нет доступа к чату, переподключение не поможет
+        if (closed || event.code === 4403 || event.code === 4404) {
+          return;
+        }
+        console.log('ChatPage: WebSocket отключен, переподключение');
+        reconnectTimeout = setTimeout(() => {
+          dispatch(fetchChatMessages(chatId));
+          connect();
+        }, 3000);
+      };
+    };
+
     if (isAuthenticated && user && chatId) {
-      console.log('ChatPage: Установка интервала обновления сообщений');
-      intervalId = setInterval(() => {
-        console.log('ChatPage: Периодическое обновление сообщений');
-        dispatch(fetchChatMessages(chatId));
-      }, 5000);
+      connect();
     }
 
     return () => {
-      if (intervalId) {
-        console.log('ChatPage: Очистка интервала обновления сообщений');
-        clearInterval(intervalId);
+      closed = true;
+      if (reconnectTimeout) {
+        clearTimeout(reconnectTimeout);
+      }
+      if (socket) {
+        console.log('ChatPage: Закрытие WebSocket чата');
+        socket.close();
       }
       dispatch(setCurrentChat(null));
       setMessagesMarkedAsRead(false);
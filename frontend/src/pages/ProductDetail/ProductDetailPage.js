@@ -293,7 +293,10 @@ function ProductDetailPage() {
             >
               {product.images?.length ? (
                 <img
-                  src={product.images[currentImageIndex]?.image}
+                  src={
+                    product.images[currentImageIndex]?.webp ||
+                    product.images[currentImageIndex]?.image
+                  }
                   alt={product.title}
                   style={{
                     width: '100%',
@@ -323,7 +326,7 @@ function ProductDetailPage() {
                     onClick={() => handleImageClick(image.image, index)}
                   >
                     <img
-                      src={image.image}
+                      src={image.thumbnail || image.image}
                       alt={`${product.title} ${index + 1}`}
                       style={{
                         width: '100%',
@@ -81,6 +81,7 @@ const sortOptions = [
   { value: 'price', label: 'Сначала дешевле' },
   { value: '-price', label: 'Сначала дороже' },
   { value: '-views_count', label: 'По популярности' },
+  { value: '-favorites_count', label: 'Чаще в избранном' },
 ];
 
 const conditions = [
@@ -26,7 +26,8 @@ export const fetchChatMessages = createAsyncThunk(
   async (chatId, { rejectWithValue }) => {
     try {
       console.log('chatSlice: Запрос сообщений чата:', chatId);
-      const response = await api.getChatMessages(chatId);
+      // Последние сообщения чата; новые приходят через WebSocket
+      const response = await api.getChatMessages(chatId, { latest: 1 });
       console.log('chatSlice: Ответ от сервера (сообщения):', response.data);
       return response.data;
     } catch (error) {
@@ -99,6 +100,32 @@ const chatSlice = createSlice({
     setCurrentChat: (state, action) => {
       state.currentChat = action.payload;
     },
+    // Сообщение, полученное через WebSocket
+    messageReceived: (state, action) => {
+      const message = action.payload;
+      if (!Array.isArray(state.messages)) {
+        state.messages = [];
+      }
+      if (!state.messages.some(item => item.id === message.id)) {
+        state.messages.push({
+          id: message.id,
+          text: message.text,
+          sender: message.sender,
+          sender_username: message.sender_username,
+          created_at: message.created_at,
+          is_read: message.is_read,
+        });
+      }
+    },
+    // Собеседник прочитал сообщения
+    messagesRead: (state, action) => {
+      const readerId = action.payload;
+      if (Array.isArray(state.messages)) {
+        state.messages = state.messages.map(message =>
+          message.sender !== readerId ? { ...message, is_read: true } : message
+        );
+      }
+    },
   },
   extraReducers: builder => {
     builder
@@ -240,6 +267,6 @@ const chatSlice = createSlice({
   },
 });
 
-export const { clearError, setCurrentChat } = chatSlice.actions;
+export const { clearError, setCurrentChat, messageReceived, messagesRead } = chatSlice.actions;
 
 export default chatSlice.reducer;
@@ -99,7 +99,11 @@ export const toggleFavorite = createAsyncThunk(
   async (slug, { rejectWithValue }) => {
     try {
       const response = await api.toggleFavorite(slug);
-      return { slug, status: response.data.status };
+      return {
+        slug,
+        status: response.data.status,
+        favorites_count: response.data.favorites_count,
+      };
     } catch (error) {
       return rejectWithValue(error.response.data);
     }
@@ -249,12 +253,14 @@ const productsSlice = createSlice({
         state.loading = false;
         if (state.currentProduct && state.currentProduct.slug === action.payload.slug) {
           state.currentProduct.is_favorite = action.payload.status === 'added to favorites';
+          state.currentProduct.favorites_count = action.payload.favorites_count;
         }
         state.items = state.items.map(item => {
           if (item.slug === action.payload.slug) {
             return {
               ...item,
               is_favorite: action.payload.status === 'added to favorites',
+              favorites_count: action.payload.favorites_count,
             };
           }
           return item;